@@ -0,0 +1,184 @@
+"""Content-addressed store for agent deliverables.
+
+Each artifact is written once to ARTIFACTS_DIR under its SHA-256 and referred
+to everywhere else (graph state, job rows, session state) by a short
+"sha256:<hex>" reference, so identical outputs are stored once and large
+texts are only read when they are shown or exported.
+
+    python artifacts.py export <run_id> project.zip
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+# main.py and the command line import this module before workflow, which loads .env for the rest
+load_dotenv()
+ARTIFACTS_DIR = os.getenv("artifacts_dir", "artifacts")
+REF_PREFIX = "sha256:"
+# Decoded artifacts kept in memory, shared by every session of the process
+CACHE_ENTRIES = 32
+
+# Files of an exported project: (path in the archive, state key, extract code from markdown)
+PROJECT_LAYOUT = [
+    ("app.py", "code", True),
+    ("test_app.py", "tests", True),
+    ("README.md", "deploy", False),
+    ("docs/requirements.md", "requirements", False),
+    ("docs/design.md", "design", False),
+    ("docs/review.md", "review", False),
+    ("docs/verification.md", "verification", False),
+]
+
+
+def is_ref(value):
+    return isinstance(value, str) and value.startswith(REF_PREFIX) and len(value) == len(REF_PREFIX) + 64
+
+
+class ArtifactStore:
+    """Immutable texts on disk, addressed by the hash of their content"""
+
+    def __init__(self, root=ARTIFACTS_DIR, cache_entries=CACHE_ENTRIES):
+        self.root = root
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, ref):
+        digest = ref[len(REF_PREFIX):]
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, text):
+        """Store text and return its reference; storing the same text again is free"""
+        data = text.encode("utf-8")
+        ref = REF_PREFIX + hashlib.sha256(data).hexdigest()
+        path = self.path(ref)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename, so a reader never sees a partial artifact
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return ref
+
+    def get(self, value):
+        """Text of a reference; anything that isn't one (e.g. older inline state) is returned as is"""
+        if not is_ref(value):
+            return value
+        with self._lock:
+            if value in self._cache:
+                self._cache.move_to_end(value)
+                return self._cache[value]
+        with open(self.path(value), encoding="utf-8") as f:
+            text = f.read()
+        with self._lock:
+            self._cache[value] = text
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return text
+
+    def open(self, value):
+        """Binary file object over an artifact, for copying without loading it"""
+        if not is_ref(value):
+            return io.BytesIO((value or "").encode("utf-8"))
+        return open(self.path(value), "rb")
+
+    def size(self, value):
+        if not is_ref(value):
+            return len((value or "").encode("utf-8"))
+        return os.path.getsize(self.path(value))
+
+    def project_files(self, refs):
+        """(archive path, size, opener) for each deliverable present in refs"""
+        from verify import extract_code
+
+        files = []
+        for name, key, is_code in PROJECT_LAYOUT:
+            value = refs.get(key)
+            if not value:
+                continue
+            if is_code:
+                # Code is small and needs its markdown fences stripped, so it is decoded
+                data = extract_code(self.get(value)).encode("utf-8")
+                files.append((name, len(data), lambda data=data: io.BytesIO(data)))
+            else:
+                files.append((name, self.size(value), lambda value=value: self.open(value)))
+        return files
+
+    def export_zip(self, refs, fileobj, root="project"):
+        """Write the project as a zip to fileobj, one streamed member at a time"""
+        with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, _, opener in self.project_files(refs):
+                with opener() as src, archive.open(f"{root}/{name}", "w") as dst:
+                    shutil.copyfileobj(src, dst)
+        return fileobj
+
+    def export_tar(self, refs, fileobj, root="project"):
+        """Write the project as a gzipped tarball to fileobj, streaming each member"""
+        with tarfile.open(fileobj=fileobj, mode="w|gz") as archive:
+            for name, size, opener in self.project_files(refs):
+                info = tarfile.TarInfo(f"{root}/{name}")
+                info.size = size
+                with opener() as src:
+                    archive.addfile(info, src)
+        return fileobj
+
+    def export_file(self, refs, fmt="zip"):
+        """Export to a file under the store, reused while the deliverables are unchanged; returns its path"""
+        digest = hashlib.sha256("\n".join(f"{k}={refs.get(k)}" for _, k, _ in PROJECT_LAYOUT).encode()).hexdigest()
+        path = os.path.join(self.root, "exports", f"{digest[:16]}.{'zip' if fmt == 'zip' else 'tar.gz'}")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                (self.export_zip if fmt == "zip" else self.export_tar)(refs, f)
+            os.replace(tmp_path, path)
+        return path
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """Process-wide artifact store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+        return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the deliverables of a finished run")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("run_id", help="job id (the run_id in the app URL) or batch thread id")
+    parser.add_argument("output", help="archive to write, .zip or .tar.gz")
+    settings = parser.parse_args()
+    from workflow import load_state_refs
+
+    refs = asyncio.run(load_state_refs(settings.run_id))
+    if not refs:
+        parser.error(f"no run {settings.run_id!r} found")
+    store = get_artifact_store()
+    with open(settings.output, "wb") as f:
+        if settings.output.endswith((".tar.gz", ".tgz")):
+            store.export_tar(refs, f)
+        else:
+            store.export_zip(refs, f)
+    print(f"wrote {settings.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Headless batch runner: run the six-agent workflow for every spec in a JSONL file.
+
+Each input line is a JSON object with a "spec" and an optional, unique "id". Results are
+appended to the output JSONL as soon as each spec finishes, and stages are
+checkpointed, so a rerun after a crash skips finished specs and resumes the
+unfinished ones at their first incomplete stage.
+
+    python batch.py specs.jsonl results.jsonl --concurrency 8
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+from workflow import CHECKPOINT_DB, WorkflowHooks, load_artifacts, open_checkpointer, run_or_resume
+
+logger = logging.getLogger("batch")
+
+
+class LoggingHooks(WorkflowHooks):
+    """Log agent handovers and errors for one spec"""
+
+    def __init__(self, spec_id):
+        self.spec_id = spec_id
+
+    def communicate(self, agent_name, message, recipient=None, is_handover=False):
+        if is_handover:
+            logger.info("[%s] %s: %s", self.spec_id, agent_name, message)
+
+    def speculation_finished(self, report):
+        logger.info("[%s] speculation hid %.1fs, wasted %.1fs", self.spec_id, report["hidden_seconds"], report["wasted_seconds"])
+
+    def error(self, message):
+        logger.error("[%s] %s", self.spec_id, message)
+
+
+def load_specs(path):
+    """Read specs from JSONL, giving each a stable id (ValueError if two specs share one)"""
+    specs = []
+    lines = {}
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            spec_id = str(item.get("id") or hashlib.sha256(item["spec"].encode("utf-8")).hexdigest()[:16])
+            # Each id is its own checkpoint thread and results entry: two runs under one id would corrupt both
+            if spec_id in lines:
+                raise ValueError(f"{path}:{number}: spec id {spec_id!r} already used on line {lines[spec_id]}"
+                                 + ("" if item.get("id") else " (same spec text; give each an \"id\")"))
+            lines[spec_id] = number
+            specs.append({"id": spec_id, "spec": item["spec"]})
+    return specs
+
+
+def finished_ids(path):
+    """Ids the results file records as finished successfully; failed specs are run again"""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if record.get("status") == "ok":
+                    done.add(record["id"])
+            except (ValueError, KeyError):
+                # A line cut short by a crash; the spec is simply run again
+                continue
+    return done
+
+
+async def run_spec(item, checkpointer, settings):
+    """Run (or resume) the workflow for one spec"""
+    config = {"configurable": {
+        "thread_id": f"batch-{item['id']}",
+        "hooks": LoggingHooks(item["id"]),
+        "bypass_cache": settings.bypass_cache,
+        "stream": False,
+        "speculate": settings.speculate,
+    }}
+    # A spec with a checkpoint was interrupted earlier and resumes instead of starting over
+    return await run_or_resume(item["spec"], config, checkpointer)
+
+
+async def run_batch(settings):
+    specs = load_specs(settings.specs)
+    done = finished_ids(settings.output)
+    pending = [item for item in specs if item["id"] not in done]
+    logger.info("%d specs, %d already finished, %d to run", len(specs), len(done), len(pending))
+
+    queue = asyncio.Queue()
+    for item in pending:
+        queue.put_nowait(item)
+
+    async with open_checkpointer(settings.checkpoint_db) as checkpointer:
+        with open(settings.output, "a", encoding="utf-8") as out:
+
+            async def worker():
+                while True:
+                    try:
+                        item = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    start = time.time()
+                    record = {"id": item["id"], "spec": item["spec"]}
+                    try:
+                        state = load_artifacts(await run_spec(item, checkpointer, settings))
+                        record.update({key: state.get(key, "") for key in
+                                       ["requirements", "design", "code", "review", "tests", "verification", "deploy"]})
+                        record["status"] = "ok"
+                    except Exception as e:
+                        logger.exception("[%s] run failed", item["id"])
+                        record.update({"status": "error", "error": str(e)})
+                    record["seconds"] = round(time.time() - start, 3)
+                    # Write each result as soon as it is ready so a crash loses nothing finished
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                    os.fsync(out.fileno())
+                    logger.info("[%s] %s in %.1fs", item["id"], record["status"], record["seconds"])
+
+            await asyncio.gather(*(worker() for _ in range(max(1, settings.concurrency))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the multi-agent SDLC workflow for a JSONL file of project specs")
+    parser.add_argument("specs", help="JSONL file, one {\"id\": ..., \"spec\": ...} object per line")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=4, help="specs processed at the same time")
+    parser.add_argument("--checkpoint-db", default=CHECKPOINT_DB, help="SQLite file for stage checkpoints")
+    parser.add_argument("--bypass-cache", action="store_true", help="ignore cached LLM responses")
+    parser.add_argument("--speculate", action="store_true", help="start stages early from partial upstream output")
+    settings = parser.parse_args()
+    try:
+        # Reject a bad specs file before any run starts
+        load_specs(settings.specs)
+    except ValueError as e:
+        parser.error(str(e))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(run_batch(settings))
+
+
+if __name__ == "__main__":
+    main()
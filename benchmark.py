@@ -0,0 +1,214 @@
+"""Offline benchmarks of the workflow orchestration.
+
+Runs the full graph against the deterministic fake LLM, so the numbers measure
+graph compilation, prompt construction, state handling, checkpointing and
+rendering rather than a model. Results are saved as JSON and can be compared
+against an earlier baseline:
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Always offline; the fake backend is not metered, so the shared request quota never throttles it
+os.environ["llm_backend"] = "fake"
+os.environ["job_workers"] = "0"
+
+import workflow
+from llm import fake_response
+from telemetry import get_recorder
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+# Regressions smaller than this many seconds are noise, whatever the ratio
+NOISE_SECONDS = 0.01
+
+
+def run_config(thread_id):
+    return {"configurable": {"thread_id": thread_id, "bypass_cache": True, "stream": True}}
+
+
+def bench_compile(repeats):
+    """Seconds to build and compile the graph"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        workflow.create_workflow()
+        times.append(time.perf_counter() - start)
+    return {"mean_seconds": statistics.mean(times), "min_seconds": min(times)}
+
+
+async def run_once(checkpointer, thread_id, spec=workflow.DEFAULT_SPEC):
+    start = time.perf_counter()
+    await workflow.run_workflow(workflow.initial_state(spec), run_config(thread_id), checkpointer)
+    return time.perf_counter() - start
+
+
+async def bench_size(checkpointer, size, repeats):
+    """End-to-end and per-stage latency and peak memory for outputs of size characters"""
+    workflow.FAKE_RESPONSE_CHARS = size
+    totals, stages = [], {}
+    tracemalloc.start()
+    for i in range(repeats):
+        thread_id = f"bench-{size}-{i}-{time.time_ns()}"
+        totals.append(await run_once(checkpointer, thread_id))
+        for record in get_recorder().recent(thread_id):
+            stage = stages.setdefault(record["node"], {"wall": [], "overhead": []})
+            stage["wall"].append(record["wall_seconds"])
+            # Everything a stage spends outside the LLM call is orchestration cost
+            stage["overhead"].append(record["wall_seconds"] - record["llm_seconds"])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "e2e_seconds": statistics.median(totals),
+        "peak_mb": peak / 1024 / 1024,
+        "stages": {
+            node: {"wall_seconds": statistics.median(t["wall"]), "overhead_seconds": statistics.median(t["overhead"])}
+            for node, t in stages.items()
+        },
+    }
+
+
+async def bench_throughput(checkpointer, size, concurrency):
+    """Completed runs per second with concurrency runs in flight at once"""
+    workflow.FAKE_RESPONSE_CHARS = size
+    start = time.perf_counter()
+    # A spec per run keeps identical prompts from being coalesced into one call
+    await asyncio.gather(*(run_once(checkpointer, f"bench-tp-{concurrency}-{i}-{time.time_ns()}",
+                                    f"{workflow.DEFAULT_SPEC}\n\n(Benchmark run {i})")
+                           for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "runs_per_sec": concurrency / elapsed}
+
+
+def bench_ui(size, repeats):
+    """Seconds for one script run of the Streamlit page showing a finished run of this size"""
+    from streamlit.testing.v1 import AppTest
+    from jobs import JobStore
+
+    store = JobStore()
+    job_id = store.submit(workflow.DEFAULT_SPEC)
+    for key in workflow.NODE_OUTPUTS.values():
+        store.put_output(job_id, key, fake_response(key, size), complete=True)
+    store.update(job_id, status="done")
+    times = []
+    for _ in range(repeats):
+        app = AppTest.from_file(MAIN_SCRIPT, default_timeout=120)
+        app.query_params["run_id"] = job_id
+        start = time.perf_counter()
+        app.run()
+        times.append(time.perf_counter() - start)
+    return {"render_seconds": statistics.median(times)}
+
+
+async def run_benchmarks(settings):
+    results = {"meta": {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "latency": settings.latency,
+        "repeats": settings.repeats,
+        "timestamp": time.time(),
+    }}
+    workflow.FAKE_LATENCY = settings.latency
+    results["compile"] = bench_compile(max(5, settings.repeats))
+    async with workflow.open_checkpointer() as checkpointer:
+        results["sizes"] = {}
+        for size in settings.sizes:
+            results["sizes"][str(size)] = await bench_size(checkpointer, size, settings.repeats)
+            print(f"size {size}: {results['sizes'][str(size)]['e2e_seconds']:.3f}s end to end", file=sys.stderr)
+        results["throughput"] = {}
+        for concurrency in settings.concurrency:
+            results["throughput"][str(concurrency)] = await bench_throughput(checkpointer, settings.sizes[0], concurrency)
+            print(f"concurrency {concurrency}: {results['throughput'][str(concurrency)]['runs_per_sec']:.2f} runs/s",
+                  file=sys.stderr)
+    if settings.ui:
+        results["ui"] = {str(size): bench_ui(size, settings.repeats) for size in settings.sizes}
+    try:
+        import resource
+        # ru_maxrss is KB on Linux, bytes on macOS
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        results["meta"]["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    except ImportError:
+        pass
+    return results
+
+
+def flatten(results, prefix=""):
+    """{"sizes.1000.e2e_seconds": 0.12, ...} for every number outside meta"""
+    flat = {}
+    for key, value in results.items():
+        if key == "meta":
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    """Metrics that got worse than the baseline by more than tolerance"""
+    regressions = []
+    old = flatten(baseline)
+    for name, value in flatten(current).items():
+        if name not in old or not old[name]:
+            continue
+        # Throughput is better when higher, everything else when lower
+        ratio = old[name] / value if name.endswith("runs_per_sec") else value / old[name]
+        noise = name.endswith("_seconds") and abs(value - old[name]) < NOISE_SECONDS
+        if ratio > 1 + tolerance and not noise:
+            regressions.append(f"{name}: {old[name]:.4g} -> {value:.4g} ({(ratio - 1) * 100:+.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the workflow orchestration against the offline fake LLM")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000],
+                        help="characters per fake LLM response")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="concurrent runs to measure")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per measurement (the median is reported)")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake LLM latency per call, in seconds")
+    parser.add_argument("--ui", action="store_true", help="also time Streamlit page runs (needs streamlit)")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to save the results")
+    parser.add_argument("--compare", help="baseline results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before it counts as a regression")
+    settings = parser.parse_args()
+    output = os.path.abspath(settings.output)
+    baseline = None
+    if settings.compare:
+        with open(settings.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    # Checkpoints, caches and metrics of the benchmark runs go to a scratch directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="sdlc-bench-") as scratch:
+        os.chdir(scratch)
+        try:
+            results = asyncio.run(run_benchmarks(settings))
+        finally:
+            os.chdir(cwd)
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps({key: value for key, value in results.items() if key != "meta"}, indent=2))
+    if baseline is not None:
+        regressions = compare(results, baseline, settings.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Single-flight coalescing of identical in-flight LLM calls.
+
+Sessions run on different worker threads, each with its own event loop. When
+several of them send the same prompt to the same model at once, only the
+first (the leader) calls the model; the others follow its flight and receive
+every chunk as it arrives, then the same result or error.
+"""
+
+import asyncio
+import threading
+
+
+class FlightAbandoned(ConnectionError):
+    """The leader of a flight stopped before it finished; followers retry on their own"""
+
+
+class Flight:
+    """Chunks of one in-flight call, shared by every session waiting on it"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._waiters = set()
+        self._lock = threading.Lock()
+
+    def publish(self, chunk=None, error=None, done=False):
+        with self._lock:
+            if chunk is not None:
+                self.chunks.append(chunk)
+            self.error = error or self.error
+            self.done = done or self.done
+            waiters = list(self._waiters)
+        # Wake each follower on its own event loop
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The follower's loop has closed; it no longer needs the chunks
+                pass
+
+    async def follow(self):
+        """Yield the flight's chunks from the first, waiting for new ones until it is done"""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        seen = 0
+        try:
+            while True:
+                with self._lock:
+                    chunks, done, error = self.chunks[seen:], self.done, self.error
+                    waiter[1].clear()
+                for chunk in chunks:
+                    yield chunk
+                seen += len(chunks)
+                if done:
+                    if error is not None:
+                        raise error
+                    return
+                await waiter[1].wait()
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+class SingleFlight:
+    """Process-wide table of in-flight calls by key, with counters of how often calls were shared"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def join(self, key):
+        """(flight, is_leader) for key: a new flight if none is in progress, else the running one"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self.leaders += 1
+            return flight, True
+
+    def _land(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def stream(self, key, start, on_coalesced=None):
+        """Chunks of start() (an async iterator factory), called once for all concurrent callers of key"""
+        flight, leader = self.join(key)
+        if not leader:
+            if on_coalesced:
+                on_coalesced()
+            async for chunk in flight.follow():
+                yield chunk
+            return
+        source = start()
+        try:
+            async for chunk in source:
+                flight.publish(chunk)
+                yield chunk
+        except Exception as e:
+            self._land(key, flight)
+            flight.publish(error=e, done=True)
+            raise
+        except GeneratorExit:
+            # The leader has all it needs (e.g. a complete module): the flight ends there for everyone
+            self._land(key, flight)
+            flight.publish(done=True)
+            await source.aclose()
+            raise
+        except BaseException:
+            # Cancelled, or the leader stopped reading: followers must not wait forever
+            self._land(key, flight)
+            flight.publish(error=FlightAbandoned("shared LLM call was abandoned by its leader"), done=True)
+            await source.aclose()
+            raise
+        self._land(key, flight)
+        flight.publish(done=True)
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._flights)
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": in_flight}
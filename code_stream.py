@@ -0,0 +1,203 @@
+"""Incremental parsing of streamed Python answers.
+
+Code-producing stages are asked for bare Python but often wrap it in markdown
+fences and prose. CodeStreamParser takes the stream chunk by chunk, keeps only
+the code, checks each finished top-level statement with ast as it arrives, and
+reports the module complete once nothing but prose can follow: a fenced block
+closing, or prose starting, after a `__main__` guard with code that parses. The
+rest of the answer (usually explanations) then need not be generated.
+"""
+
+import ast
+import re
+
+FENCE_OPEN = re.compile(r"^\s*```\s*([\w+-]*)\s*$")
+FENCE_CLOSE = re.compile(r"^\s*```\s*$")
+PYTHON_FENCES = {"", "python", "py", "python3"}
+# Lines a bare (unfenced) module can start with
+CODE_START = re.compile(
+    r"^(import\s|from\s+\S+\s+import\s|(async\s+)?def\s|class\s|@|#|\"\"\"|'''|if\s+__name__|try:|with\s|for\s|while\s"
+    r"|[A-Za-z_][\w.]*(\[.*\])?\s*=|[A-Za-z_][\w.]*\()"
+)
+# Annotated assignments look like prose ("Note: x = 5 is used"): a capitalized word before the colon is
+# taken as a label, and the line must also parse or open a bracket
+ANNOTATED = re.compile(r"^(?![A-Z][a-z]+:)[A-Za-z_][\w.]*\s*:\s*[^=]+=(?!=)")
+OPENERS = ("(", "[", "{", ",", "\\")
+# Column-0 lines that continue a statement rather than start a new one
+CONTINUATION = re.compile(r"^(else|elif|except|finally|case)\b|^[)\]}]")
+MAIN_GUARD = re.compile(r"^if\s+__name__\s*==")
+STRING_START = re.compile(r"\"\"\"|'''|\"|'|#")
+
+
+def parses(source):
+    try:
+        ast.parse(source)
+    except SyntaxError:
+        return False
+    return True
+
+
+def _closing_quote(line, quote, start):
+    """Index of the first unescaped quote in line at or after start, or -1"""
+    at = line.find(quote, start)
+    while at != -1 and (at - len(line[:at].rstrip("\\"))) % 2:
+        at = line.find(quote, at + 1)
+    return at
+
+
+def open_string(line, quote=None):
+    """The triple quote still open at the end of line, given the one open at its start (or None)"""
+    at = 0
+    while True:
+        if quote:
+            end = _closing_quote(line, quote, at)
+            if end == -1:
+                return quote
+            at, quote = end + len(quote), None
+        token = STRING_START.search(line, at)
+        if token is None or token.group() == "#":
+            return None
+        if len(token.group()) == 3:
+            at, quote = token.end(), token.group()
+            continue
+        # A one-line string: skip it so quotes inside it don't count
+        end = _closing_quote(line, token.group(), token.end())
+        if end == -1:
+            return None
+        at = end + 1
+
+
+def starts_code(line):
+    """Whether a column-0 line looks like the start of a statement rather than prose"""
+    if CODE_START.match(line):
+        return True
+    return bool(ANNOTATED.match(line)) and (parses(line) or line.rstrip().endswith(OPENERS))
+
+
+class CodeStreamParser:
+    """Feed an answer chunk by chunk; .code is the Python in it, .complete once the module is done"""
+
+    def __init__(self, check_statements=True):
+        # Whole answers (cached, non-streamed) skip the per-statement checks and are parsed once at the end
+        self.check_statements = check_statements
+        self.state = "prose"  # prose, fenced, skip (a non-Python fence), bare, done
+        self.blocks = []
+        self.lines = []
+        self.pending = ""
+        self.verified = 0  # leading lines of self.lines known to parse as whole statements
+        self.main_guard = False
+        self.string = None  # triple quote of a string still open at the end of the last code line
+        self.error = None
+
+    @property
+    def complete(self):
+        return self.state == "done"
+
+    @property
+    def code(self):
+        return "\n\n".join(self.blocks + ["\n".join(self.lines)]).strip("\n") + "\n" if self.blocks or self.lines else ""
+
+    def feed(self, chunk):
+        """Add a chunk of the answer; returns True once the module is complete"""
+        if self.complete:
+            return True
+        self.pending += chunk
+        *lines, self.pending = self.pending.split("\n")
+        for line in lines:
+            self._line(line)
+            if self.complete:
+                break
+        return self.complete
+
+    def finish(self):
+        """The code once the answer has ended, with trailing prose dropped and error set if it doesn't parse"""
+        if self.pending and not self.complete:
+            self._line(self.pending)
+        self.pending = ""
+        if self.state == "bare":
+            self._trim_prose()
+        code = self.code
+        try:
+            ast.parse(code)
+            self.error = None
+        except SyntaxError as e:
+            self.error = f"line {e.lineno}: {e.msg}"
+        return code
+
+    def _line(self, line):
+        if self.state == "prose":
+            fence = FENCE_OPEN.match(line)
+            if fence:
+                self.state = "fenced" if fence.group(1).lower() in PYTHON_FENCES else "skip"
+            elif starts_code(line):
+                self.state = "bare"
+                self._code_line(line)
+        elif self.state == "skip":
+            if FENCE_CLOSE.match(line):
+                self.state = "prose"
+        elif self.string:
+            # Inside a triple-quoted string fences and prose are just text (e.g. a help message with an example)
+            self._code_line(line)
+        elif self.state == "fenced":
+            if FENCE_CLOSE.match(line):
+                self._close_block()
+            else:
+                self._code_line(line)
+        elif self.state == "bare":
+            fence = FENCE_OPEN.match(line)
+            if fence and fence.group(1):
+                self._leave_bare(fence.group(1).lower() in PYTHON_FENCES)
+            elif FENCE_CLOSE.match(line):
+                self._close_block()
+            elif self._ends_bare_module(line):
+                self.state = "done"
+            else:
+                self._code_line(line)
+
+    def _code_line(self, line):
+        # A new top-level statement: check the statements finished since the last check
+        if self.check_statements and line[:1].strip() and not CONTINUATION.match(line) and len(self.lines) > self.verified:
+            if parses("\n".join(self.lines[self.verified:])):
+                self.verified = len(self.lines)
+        self.main_guard = self.main_guard or (not self.string and bool(MAIN_GUARD.match(line)))
+        self.string = open_string(line, self.string)
+        self.lines.append(line)
+
+    def _close_block(self):
+        self.blocks.append("\n".join(self.lines))
+        self.lines, self.verified = [], 0
+        # Code split over several blocks is joined; only a main guard shows no more code will follow
+        self.state = "done" if self.main_guard and parses("\n\n".join(self.blocks)) else "prose"
+
+    def _leave_bare(self, python):
+        # A labelled fence: bare lines before real Python were prose that looked like code
+        if python or not parses("\n".join(self.lines)):
+            self.lines = []
+        elif self.lines:
+            self.blocks.append("\n".join(self.lines))
+            self.lines = []
+        self.verified = 0
+        self.main_guard = any(MAIN_GUARD.match(line) for block in self.blocks for line in block.split("\n"))
+        self.state = "fenced" if python else "skip"
+
+    def _ends_bare_module(self, line):
+        """Prose at column 0 after a finished main guard marks the end of an unfenced module"""
+        if not self.main_guard or not line[:1].strip() or starts_code(line) or CONTINUATION.match(line):
+            return False
+        # Statements before the last verified one are known to parse; only the rest needs checking
+        return parses("\n".join(self.lines[self.verified:]))
+
+    def _trim_prose(self):
+        # Drop trailing lines that are neither indented nor code-like while the module doesn't parse
+        while self.lines and not parses("\n".join(self.lines)):
+            last = self.lines[-1]
+            if last.strip() and (last[:1].isspace() or starts_code(last) or CONTINUATION.match(last)):
+                break
+            self.lines.pop()
+
+
+def clean_code(text):
+    """(code, error) for a whole answer: its Python without fences or prose, and why it doesn't parse (or None)"""
+    parser = CodeStreamParser(check_statements=False)
+    parser.feed(text)
+    return parser.finish(), parser.error
@@ -0,0 +1,186 @@
+import ast
+import hashlib
+import re
+
+from llm import estimate_tokens
+
+# Token budget for each upstream artifact a node reads
+STAGE_BUDGETS = {
+    "Design": {"requirements": 6000},
+    "Dev": {"design": 6000},
+    "Review": {"code": 8000},
+    "Testing": {"code": 8000},
+    # Fix needs the code verbatim for its patch to apply
+    "Fix": {"review": 1500, "code": 12000},
+    "Deploy": {"requirements": 600, "design": 800, "code": 1500, "review": 600, "tests": 600, "verification": 300},
+}
+
+# Code a node sees only as a structural index (signatures, not bodies)
+STRUCTURAL_INPUTS = {
+    "Deploy": ["code", "tests"],
+}
+
+# Sections kept first when an artifact has to be cut down for a node
+SECTION_PRIORITIES = {
+    "Design": {"requirements": ["functional", "user stor", "acceptance", "constraint"]},
+    "Dev": {"design": ["function", "data structure", "class", "flow", "error"]},
+    "Fix": {"review": ["bug", "security", "verdict", "improvement", "refactor"]},
+    "Deploy": {
+        "requirements": ["functional", "constraint", "non-functional"],
+        "design": ["overview", "architecture", "security", "performance"],
+        "review": ["verdict", "security", "bug", "quality"],
+    },
+}
+
+HEADING = re.compile(r"^(#{1,6}\s+.+|\*\*[^*]+\*\*:?\s*)$")
+
+# Compacted artifacts keyed by content hash, so each is summarized once per budget
+_compact_cache = {}
+_COMPACT_CACHE_SIZE = 256
+
+
+def split_sections(text):
+    """Split markdown into (heading, body) pairs; text before the first heading has an empty heading"""
+    sections = []
+    heading, lines = "", []
+    for line in text.splitlines():
+        if HEADING.match(line.strip()):
+            if heading or lines:
+                sections.append((heading, "\n".join(lines).strip()))
+            heading, lines = line.strip(), []
+        else:
+            lines.append(line)
+    if heading or lines:
+        sections.append((heading, "\n".join(lines).strip()))
+    return sections
+
+
+def deduplicate(text):
+    """Drop repeated paragraphs, keeping the first occurrence"""
+    seen = set()
+    kept = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        normalized = " ".join(paragraph.split()).lower()
+        if normalized and normalized in seen:
+            continue
+        seen.add(normalized)
+        kept.append(paragraph)
+    return "\n\n".join(kept)
+
+
+def first_sentence(body, limit=200):
+    """First sentence of a section body, capped at limit characters"""
+    sentence = re.split(r"(?<=[.!?])\s", " ".join(body.split()), maxsplit=1)[0] if body else ""
+    return sentence[:limit]
+
+
+def extract_sections(text, keywords, budget):
+    """Keep whole sections, priority keywords first, and a one-line digest of the rest"""
+    sections = split_sections(text)
+    ranked = sorted(
+        range(len(sections)),
+        key=lambda i: (not any(k in sections[i][0].lower() for k in keywords), i),
+    )
+    chosen, used = {}, 0
+    for i in ranked:
+        full = "\n".join(part for part in sections[i] if part)
+        if used + estimate_tokens(full) <= budget:
+            chosen[i] = full
+            used += estimate_tokens(full)
+    for i in ranked:
+        if i not in chosen:
+            digest = f"{sections[i][0]} {first_sentence(sections[i][1])}".strip()
+            if digest and used + estimate_tokens(digest) <= budget:
+                chosen[i] = digest
+                used += estimate_tokens(digest)
+    return "\n\n".join(chosen[i] for i in sorted(chosen))
+
+
+def summary_comment(node):
+    doc = ast.get_docstring(node)
+    return f"  # {doc.splitlines()[0]}" if doc else ""
+
+
+def signature(node, indent=""):
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}{summary_comment(node)}"
+
+
+def outline_code(source):
+    """Structural index of a Python module (imports, constants, classes, signatures), or None if it doesn't parse"""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+    lines, imports = [], []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            imports += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            imports.append(node.module or ".")
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            lines.append(signature(node))
+        elif isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(base) for base in node.bases)
+            lines.append(f"class {node.name}{f'({bases})' if bases else ''}:{summary_comment(node)}")
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    lines.append(signature(item, "    "))
+                elif isinstance(item, ast.AnnAssign):
+                    lines.append(f"    {ast.unparse(item.target)}: {ast.unparse(item.annotation)}")
+        elif isinstance(node, ast.Assign) and all(isinstance(t, ast.Name) and t.id.isupper() for t in node.targets):
+            lines.append(f"{', '.join(t.id for t in node.targets)} = ...")
+        elif isinstance(node, ast.If) and "__main__" in ast.unparse(node.test):
+            lines.append(f"if {ast.unparse(node.test)}: ...")
+    if imports:
+        lines.insert(0, f"# imports: {', '.join(dict.fromkeys(imports))}")
+    return "\n".join(lines)
+
+
+def truncate(text, budget):
+    """Hard cap at the budget, marking the cut"""
+    limit = budget * 4
+    if len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + "\n... [truncated to fit context budget]"
+
+
+def compact(text, budget, keywords=(), is_code=False):
+    """Shrink text to fit budget tokens using progressively lossier steps"""
+    if estimate_tokens(text) <= budget:
+        return text
+    key = (hashlib.sha256(text.encode("utf-8")).hexdigest(), budget, tuple(keywords), is_code)
+    if key not in _compact_cache:
+        if len(_compact_cache) >= _COMPACT_CACHE_SIZE:
+            _compact_cache.pop(next(iter(_compact_cache)))
+        _compact_cache[key] = _compact(text, budget, keywords, is_code)
+    return _compact_cache[key]
+
+
+def _compact(text, budget, keywords, is_code):
+    text = deduplicate(text)
+    if estimate_tokens(text) <= budget:
+        return text
+    if is_code:
+        outline = outline_code(text)
+        if outline and estimate_tokens(outline) <= budget:
+            return outline
+        return truncate(outline or text, budget)
+    if len(split_sections(text)) > 1:
+        return extract_sections(text, keywords, budget)
+    return truncate(text, budget)
+
+
+def fit_to_budget(node, state):
+    """Compact a node's upstream inputs to its budgets; returns (inputs, original_tokens, compacted_tokens)"""
+    budgets = STAGE_BUDGETS.get(node, {})
+    priorities = SECTION_PRIORITIES.get(node, {})
+    inputs, original, compacted = {}, 0, 0
+    for key, budget in budgets.items():
+        text = state.get(key, "")
+        index = outline_code(text) if key in STRUCTURAL_INPUTS.get(node, ()) else None
+        inputs[key] = compact(index or text, budget, priorities.get(key, ()), is_code=key in ("code", "tests"))
+        original += estimate_tokens(text)
+        compacted += estimate_tokens(inputs[key])
+    return inputs, original, compacted
@@ -0,0 +1,327 @@
+"""Background execution of workflow runs.
+
+The UI only submits jobs and polls their progress; a pool of worker threads
+claims queued jobs from a SQLite table and runs the graph, writing status,
+messages and (partial) outputs back to the same database. Any number of
+sessions, and dedicated worker processes, can share one jobs file:
+
+    python jobs.py --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from artifacts import get_artifact_store
+from workflow import SPECULATE, WorkflowHooks, rerun_with_edits, run_or_resume
+
+logger = logging.getLogger("jobs")
+
+JOBS_DB = "jobs.sqlite"
+# A running job whose worker has been silent this long is assumed dead and requeued
+STALE_SECONDS = 120
+
+
+class JobStore:
+    """Jobs, their messages and their outputs in a shared SQLite file"""
+
+    def __init__(self, path=JOBS_DB, artifacts=None):
+        # Finished outputs live in the artifact store; their rows keep only the reference
+        self.artifacts = artifacts or get_artifact_store()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                spec TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                status TEXT NOT NULL,
+                current_agent TEXT,
+                error TEXT,
+                created REAL NOT NULL,
+                heartbeat REAL
+            );
+            CREATE TABLE IF NOT EXISTS job_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                agent TEXT NOT NULL,
+                message TEXT NOT NULL,
+                recipient TEXT,
+                is_handover INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_outputs (
+                job_id TEXT NOT NULL,
+                key TEXT NOT NULL,
+                text TEXT NOT NULL,
+                complete INTEGER NOT NULL,
+                stats TEXT NOT NULL DEFAULT '{}',
+                version INTEGER NOT NULL DEFAULT 0,
+                ref TEXT,
+                size INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_id, key)
+            );
+        """)
+        # Columns added since the first jobs files were created
+        for column in ["version INTEGER NOT NULL DEFAULT 0", "ref TEXT", "size INTEGER NOT NULL DEFAULT 0"]:
+            try:
+                self._conn.execute(f"ALTER TABLE job_outputs ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def submit(self, spec, settings=None, job_id=None):
+        """Queue a new run and return its id"""
+        job_id = job_id or uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (job_id, spec, settings, status, created) VALUES (?, ?, ?, 'queued', ?)",
+            (job_id, spec, json.dumps(settings or {}), time.time()),
+        )
+        return job_id
+
+    def claim(self):
+        """Atomically take the oldest queued (or abandoned) job, or None"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id, spec, settings FROM jobs WHERE status = 'queued' "
+                    "OR (status = 'running' AND heartbeat < ?) ORDER BY created LIMIT 1",
+                    (now - STALE_SECONDS,),
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', error = NULL, heartbeat = ? WHERE job_id = ?",
+                        (now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if not row:
+            return None
+        return {"job_id": row[0], "spec": row[1], "settings": json.loads(row[2])}
+
+    def get(self, job_id):
+        rows = self._execute(
+            "SELECT job_id, status, current_agent, error FROM jobs WHERE job_id = ?", (job_id,)
+        )
+        if not rows:
+            return None
+        return dict(zip(["job_id", "status", "current_agent", "error"], rows[0]))
+
+    def update(self, job_id, **fields):
+        """Set job columns and refresh the heartbeat"""
+        fields["heartbeat"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def retry(self, job_id):
+        """Queue a failed job again; it resumes from its checkpoint"""
+        self._execute("UPDATE jobs SET status = 'queued', error = NULL WHERE job_id = ? AND status = 'failed'", (job_id,))
+
+    def resubmit(self, job_id, edits):
+        """Queue a finished job again with edited artifacts; only stale stages are regenerated"""
+        with self._lock:
+            row = self._conn.execute("SELECT settings FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            settings = {**json.loads(row[0]), "edits": edits}
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', error = NULL, settings = ? WHERE job_id = ?",
+                (json.dumps(settings), job_id),
+            )
+            # Every stage reports its output again, reused or regenerated
+            self._conn.execute("DELETE FROM job_outputs WHERE job_id = ?", (job_id,))
+
+    def add_message(self, job_id, agent, message, recipient=None, is_handover=False):
+        self._execute(
+            "INSERT INTO job_messages (job_id, timestamp, agent, message, recipient, is_handover) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, datetime.now().strftime("%H:%M:%S"), agent, message, recipient, int(is_handover)),
+        )
+
+    def messages(self, job_id, after_id=0):
+        """Messages newer than after_id, so pollers only fetch what they haven't seen"""
+        rows = self._execute(
+            "SELECT id, timestamp, agent, message, recipient, is_handover FROM job_messages "
+            "WHERE job_id = ? AND id > ? ORDER BY id",
+            (job_id, after_id),
+        )
+        return [
+            {"id": i, "timestamp": t, "agent": a, "message": m, "recipient": r, "is_handover": bool(h)}
+            for i, t, a, m, r, h in rows
+        ]
+
+    def put_output(self, job_id, key, text, complete):
+        """Write an output; each write bumps its version so pollers notice rewrites.
+
+        Partial text is kept inline while it streams; a complete output is stored as an artifact.
+        """
+        ref = self.artifacts.put(text) if complete else None
+        self._execute(
+            "INSERT INTO job_outputs (job_id, key, text, complete, ref, size) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (job_id, key) DO UPDATE SET text = excluded.text, complete = excluded.complete, "
+            "ref = excluded.ref, size = excluded.size, version = version + 1",
+            (job_id, key, "" if complete else text, int(complete), ref, len(text)),
+        )
+
+    def put_stats(self, job_id, key, **stats):
+        """Merge stats (stream timings, context savings) into an output's record"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stats FROM job_outputs WHERE job_id = ? AND key = ?", (job_id, key)
+            ).fetchone()
+            merged = {**(json.loads(row[0]) if row else {}), **stats}
+            self._conn.execute(
+                "INSERT INTO job_outputs (job_id, key, text, complete, stats) VALUES (?, ?, '', 0, ?) "
+                "ON CONFLICT (job_id, key) DO UPDATE SET stats = excluded.stats",
+                (job_id, key, json.dumps(merged)),
+            )
+
+    def output_status(self, job_id):
+        """{key: {"complete", "chars", "stats", "version", "ref"}} for every output written so far, without the text"""
+        rows = self._execute(
+            "SELECT key, complete, size, stats, version, ref FROM job_outputs WHERE job_id = ?", (job_id,)
+        )
+        return {key: {"complete": bool(complete), "chars": chars, "stats": json.loads(stats), "version": version, "ref": ref}
+                for key, complete, chars, stats, version, ref in rows}
+
+    def output_text(self, job_id, key):
+        rows = self._execute("SELECT text, ref FROM job_outputs WHERE job_id = ? AND key = ?", (job_id, key))
+        if not rows:
+            return ""
+        text, ref = rows[0]
+        return self.artifacts.get(ref) if ref else text
+
+
+class JobHooks(WorkflowHooks):
+    """Write a run's progress to the job store for the UI to poll"""
+
+    # Partial outputs are flushed at most this often per stage
+    FLUSH_SECONDS = 0.5
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.flushed = {}
+
+    def stage_started(self, agent_name):
+        self.store.update(self.job_id, current_agent=agent_name)
+
+    def communicate(self, agent_name, message, recipient=None, is_handover=False):
+        self.store.add_message(self.job_id, agent_name, message, recipient, is_handover)
+
+    def partial_output(self, output_key, text):
+        now = time.time()
+        if now - self.flushed.get(output_key, 0.0) >= self.FLUSH_SECONDS:
+            self.store.put_output(self.job_id, output_key, text, complete=False)
+            self.flushed[output_key] = now
+
+    def stream_finished(self, output_key, stats):
+        self.store.put_stats(self.job_id, output_key, stream=stats)
+
+    def context_compacted(self, output_key, original, compacted):
+        self.store.put_stats(self.job_id, output_key, context={"original": original, "compacted": compacted})
+
+    def speculation_finished(self, report):
+        self.store.put_stats(self.job_id, "speculation", speculation=report)
+
+    def stage_recorded(self, record):
+        # Kept per execution: Review and Fix can run several times in one run
+        self.store.put_stats(self.job_id, "metrics", **{f"{record['node']}@{record['ts']:.6f}": record})
+
+    def stage_completed(self, agent_name, output_key, output):
+        self.store.put_output(self.job_id, output_key, output, complete=True)
+
+    def error(self, message):
+        self.store.add_message(self.job_id, "Workflow", f"❌ {message}")
+
+
+class WorkerPool:
+    """Threads that claim queued jobs and run them to completion"""
+
+    def __init__(self, store, workers=2, poll_seconds=0.5):
+        self.store = store
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self.store.claim()
+            if job is None:
+                self._stop.wait(self.poll_seconds)
+                continue
+            self.run_job(job)
+
+    def run_job(self, job):
+        job_id = job["job_id"]
+        settings = job["settings"]
+        config = {"configurable": {
+            "thread_id": job_id,
+            "hooks": JobHooks(self.store, job_id),
+            "bypass_cache": settings.get("bypass_cache", False),
+            "stream": settings.get("stream", True),
+            "speculate": settings.get("speculate", SPECULATE),
+        }}
+        # Keep the heartbeat fresh during long LLM calls so the job isn't taken for dead
+        finished = threading.Event()
+
+        def beat():
+            while not finished.wait(STALE_SECONDS / 4):
+                self.store.update(job_id)
+
+        threading.Thread(target=beat, daemon=True).start()
+        logger.info("[%s] started", job_id)
+        try:
+            if settings.get("edits"):
+                asyncio.run(rerun_with_edits(settings["edits"], config))
+            else:
+                asyncio.run(run_or_resume(job["spec"], config))
+            self.store.update(job_id, status="done", current_agent=None)
+            logger.info("[%s] done", job_id)
+        except Exception as e:
+            logger.exception("[%s] failed", job_id)
+            self.store.update(job_id, status="failed", error=str(e))
+        finally:
+            finished.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued workflow jobs")
+    parser.add_argument("--workers", type=int, default=2, help="jobs executed at the same time")
+    parser.add_argument("--db", default=JOBS_DB, help="SQLite jobs file shared with the UI")
+    settings = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    pool = WorkerPool(JobStore(settings.db), settings.workers).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
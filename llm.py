@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import threading
+import time
+
+
+class LLMBackend:
+    """Minimal interface shared by all LLM backends"""
+
+    name = "base"
+    model = ""
+    # Calls count against the shared request/token quota
+    metered = True
+
+    def invoke(self, prompt):
+        """Return the full completion text for prompt"""
+        raise NotImplementedError
+
+    def stream(self, prompt):
+        """Yield the completion in chunks as they are produced"""
+        yield self.invoke(prompt)
+
+    async def ainvoke(self, prompt):
+        """Async invoke; runs the blocking call in a worker thread by default"""
+        return await asyncio.to_thread(self.invoke, prompt)
+
+    async def astream(self, prompt):
+        """Async stream; falls back to a single chunk from ainvoke"""
+        yield await self.ainvoke(prompt)
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through LangChain, with one client reused for every call"""
+
+    name = "gemini"
+
+    def __init__(self, model="gemini-1.5-flash", api_key=None, max_output_tokens=None, temperature=None):
+        from langchain_google_genai import GoogleGenerativeAI
+
+        self.model = model
+        # Unset generation settings keep the SDK defaults
+        params = {"max_output_tokens": max_output_tokens, "temperature": temperature}
+        # One attempt per call (0 would mean the SDK's default): retries are retry_with_backoff's, so each
+        # attempt goes through the shared rate limiter and reaches the router as its own call
+        self._client = GoogleGenerativeAI(
+            model=model, api_key=api_key, max_retries=1,
+            **{name: value for name, value in params.items() if value is not None},
+        )
+
+    def invoke(self, prompt):
+        result = self._client.invoke(prompt)
+        return str(result) if result else ""
+
+    def stream(self, prompt):
+        for chunk in self._client.stream(prompt):
+            if chunk:
+                yield str(chunk)
+
+    async def ainvoke(self, prompt):
+        result = await self._client.ainvoke(prompt)
+        return str(result) if result else ""
+
+    async def astream(self, prompt):
+        async for chunk in self._client.astream(prompt):
+            if chunk:
+                yield str(chunk)
+
+
+class FakeBackend(LLMBackend):
+    """Deterministic offline stand-in with configurable latency and response size"""
+
+    name = "fake"
+    metered = False
+
+    def __init__(self, latency=0.0, response_chars=2000, model="fake-llm", chunk_chars=64):
+        self.model = model
+        self.latency = float(latency)
+        self.response_chars = int(response_chars)
+        self.chunk_chars = int(chunk_chars)
+
+    def invoke(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+        return fake_response(prompt, self.response_chars)
+
+    def stream(self, prompt):
+        # A fifth of the latency goes to the first chunk, the rest is spread over the stream
+        text = fake_response(prompt, self.response_chars)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        if self.latency:
+            time.sleep(self.latency * 0.2)
+        for chunk in chunks:
+            yield chunk
+            if self.latency:
+                time.sleep(self.latency * 0.8 / len(chunks))
+
+    async def ainvoke(self, prompt):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return fake_response(prompt, self.response_chars)
+
+    async def astream(self, prompt):
+        text = fake_response(prompt, self.response_chars)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        if self.latency:
+            await asyncio.sleep(self.latency * 0.2)
+        for chunk in chunks:
+            yield chunk
+            if self.latency:
+                await asyncio.sleep(self.latency * 0.8 / len(chunks))
+
+
+class ReplayBackend(LLMBackend):
+    """Answers from a recorded run trace, with its recorded timings scaled by speed (0: no delays)"""
+
+    name = "replay"
+    metered = False
+
+    def __init__(self, path, speed=1.0, model="replay"):
+        from tracing import read_trace
+
+        self.model = model
+        self.speed = float(speed)
+        self.calls = {}
+        self.first_by_node = {}
+        for event in read_trace(path):
+            if event["event"] == "llm":
+                self.calls.setdefault(event["prompt_sha256"], event)
+                self.first_by_node.setdefault(event["node"], event)
+
+    def lookup(self, prompt):
+        """The recorded call with this prompt, else the first call of the running stage"""
+        from telemetry import stage_metrics
+        from tracing import prompt_hash
+
+        call = self.calls.get(prompt_hash(prompt))
+        if call is None:
+            # Prompts drift when a replayed run diverges (e.g. another spec); keep the stage's output
+            node = stage_metrics()["node"]
+            call = self.first_by_node.get(node)
+            if call is None:
+                raise KeyError(f"trace has no LLM call for stage {node}")
+        return call
+
+    def delay(self, seconds):
+        return seconds / self.speed if self.speed > 0 else 0.0
+
+    def invoke(self, prompt):
+        call = self.lookup(prompt)
+        time.sleep(self.delay(call["seconds"]))
+        return call["output"]
+
+    async def ainvoke(self, prompt):
+        call = self.lookup(prompt)
+        await asyncio.sleep(self.delay(call["seconds"]))
+        return call["output"]
+
+    async def astream(self, prompt):
+        call = self.lookup(prompt)
+        text = call["output"]
+        # The recorded number of chunks, evenly spaced between first chunk and end
+        count = max(1, min(call["chunks"], len(text)))
+        size = -(-len(text) // count) or 1
+        await asyncio.sleep(self.delay(call["ttft"]))
+        gap = self.delay(max(0.0, call["seconds"] - call["ttft"])) / count
+        for i in range(0, max(len(text), 1), size):
+            yield text[i:i + size]
+            if gap:
+                await asyncio.sleep(gap)
+
+
+def estimate_tokens(text):
+    """Rough local token count (about four characters per token)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def fake_response(prompt, size):
+    """Build a reproducible response of about size characters from the prompt hash"""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    # Code stages get a fenced Python module, as a real model tends to answer
+    code = "executable Python" in prompt
+    lines = ["```python", f"# Fake response {digest[:12]}"] if code else [f"# Fake response {digest[:12]}"]
+    length = sum(len(line) + 1 for line in lines)
+    i = 0
+    while length < size:
+        line = f'ITEM_{i} = "{digest[i % 48:i % 48 + 16]}"' if code else f"- item {i}: {digest[i % 48:i % 48 + 16]}"
+        lines.append(line)
+        length += len(line) + 1
+        i += 1
+    if code:
+        return "\n".join(lines + ["```"])
+    return "\n".join(lines)[:max(size, 1)]
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "fake": FakeBackend,
+    "replay": ReplayBackend,
+}
+
+# One backend instance per configuration for the whole process
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_backend(kind="gemini", **options):
+    """Return the shared backend for kind and options, creating it on first use"""
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {kind}")
+    key = (kind, tuple(sorted(options.items())))
+    with _registry_lock:
+        if key not in _registry:
+            _registry[key] = BACKENDS[kind](**options)
+        return _registry[key]
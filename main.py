@@ -1,17 +1,25 @@
-import streamlit as st
 import time
-import json
-from datetime import datetime
-from langchain_google_genai import GoogleGenerativeAI
-from langchain_core.messages import SystemMessage
-from langgraph.graph import StateGraph
-from typing import TypedDict
-from dotenv import load_dotenv
+SCRIPT_START = time.perf_counter()
+import streamlit as st
+import logging
 import os
+import re
+import uuid
+from collections import deque
+# Light imports only: langgraph and the LLM SDK load when a workflow first runs
+from artifacts import get_artifact_store
+from workflow import DEFAULT_SPEC, EXECUTED_KEYS, LLM_BACKEND, LLM_READY, NODE_AGENTS, REPLAY_SPEED, REPLAY_TRACE, NODE_OUTPUTS, SPECULATE, VERIFY_EDITS, VERIFY_TESTS, get_llm_cache, get_single_flight, loop_nodes, stale_nodes
+from jobs import JobStore, WorkerPool
+from telemetry import PROM_GLOB, STARTUP, combined_prometheus_text, get_recorder, record_startup
+record_startup("import_seconds", time.perf_counter() - SCRIPT_START)
 
-# Load API key from .env
-load_dotenv()
-API_KEY = os.getenv("api_key")
+# Worker threads started in this process; 0 leaves jobs to `python jobs.py` workers
+JOB_WORKERS = int(os.getenv("job_workers", "2"))
+# How often the page polls a running job for progress
+POLL_SECONDS = 1.0
+# Per-session rendering bounds: communications kept, characters per deliverable page
+MAX_COMMUNICATIONS = 100
+PAGE_CHARS = 20000
 
 # Initialize session state
 if 'workflow_started' not in st.session_state:
@@ -19,13 +27,36 @@ if 'workflow_started' not in st.session_state:
 if 'current_agent' not in st.session_state:
     st.session_state.current_agent = None
 if 'agent_outputs' not in st.session_state:
+    # Artifact references only; texts are loaded from the artifact store when shown
     st.session_state.agent_outputs = {}
 if 'agent_communications' not in st.session_state:
-    st.session_state.agent_communications = []
+    # Ring buffer: only the latest messages are kept and rendered
+    st.session_state.agent_communications = deque(maxlen=MAX_COMMUNICATIONS)
+if 'output_versions' not in st.session_state:
+    st.session_state.output_versions = {}
+if 'last_message_id' not in st.session_state:
+    st.session_state.last_message_id = 0
+if 'message_count' not in st.session_state:
+    st.session_state.message_count = 0
 if 'workflow_complete' not in st.session_state:
     st.session_state.workflow_complete = False
 if 'workflow_progress' not in st.session_state:
     st.session_state.workflow_progress = 0
+if 'stream_stats' not in st.session_state:
+    st.session_state.stream_stats = {}
+if 'context_savings' not in st.session_state:
+    st.session_state.context_savings = {}
+if 'speculation' not in st.session_state:
+    st.session_state.speculation = None
+if 'stage_records' not in st.session_state:
+    st.session_state.stage_records = []
+if 'workflow_error' not in st.session_state:
+    st.session_state.workflow_error = None
+if 'job_status' not in st.session_state:
+    st.session_state.job_status = None
+if 'run_id' not in st.session_state:
+    # Pick up the run from the URL so a reconnect or restart resumes it
+    st.session_state.run_id = st.query_params.get("run_id")
 
 # Page config
 st.set_page_config(
@@ -35,8 +66,13 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource
+def minified(html):
+    """Markup with whitespace collapsed, computed once per process"""
+    return re.sub(r"\s+", " ", html).strip()
+
 # Custom CSS for beautiful UI
-st.markdown("""
+PAGE_CSS = """
 <style>
     .main-header {
         background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
@@ -114,315 +150,180 @@ st.markdown("""
         margin: 1rem 0;
     }
 </style>
-""", unsafe_allow_html=True)
-
-# Shared State Type
-class BuildState(TypedDict):
-    requirements: str
-    design: str
-    code: str
-    review: str
-    tests: str
-    deploy: str
+"""
+st.markdown(minified(PAGE_CSS), unsafe_allow_html=True)
 
 # Communication and Progress Functions
-def add_communication(agent_name, message, recipient=None, is_handover=False):
-    """Add communication message to session state"""
-    comm = {
-        "timestamp": datetime.now().strftime("%H:%M:%S"),
-        "agent": agent_name,
-        "message": message,
-        "recipient": recipient,
-        "is_handover": is_handover
-    }
-    st.session_state.agent_communications.append(comm)
-
 def update_progress():
     """Update workflow progress"""
     st.session_state.workflow_progress = len(st.session_state.agent_outputs)
 
-def display_agent_completion(agent_name, output_key):
-    """Display agent completion status"""
-    st.session_state.agent_outputs[output_key] = st.session_state.get(f"temp_{output_key}", "")
-    update_progress()
-    
-    # Show completion message
-    st.markdown(f"""
-    <div class="task-complete">
-        ✅ <strong>{agent_name}</strong> - Task Completed Successfully!
-        <br>Output ready for next agent in pipeline.
-    </div>
-    """, unsafe_allow_html=True)
-
-# Enhanced Agent Functions with Real LLM Integration
-def RequirementsAgent(state):
-    st.session_state.current_agent = "Requirements Agent"
-    add_communication("Requirements Agent", "🚀 Starting requirements analysis for CLI To-Do List app...")
-    
-    # Show current agent working until task is complete
-    with st.spinner("Requirements Agent analyzing project needs..."):
-        prompt = """You are a senior software analyst with expertise in requirements engineering. 
-        
-        Define comprehensive requirements for a CLI-based To-Do List application that should include:
-        - Add new tasks with descriptions
-        - List all tasks with their current status  
-        - Delete tasks by ID or description
-        - Mark tasks as complete/incomplete
-        - Edit existing task descriptions
-        
-        Provide detailed functional and non-functional requirements in a professional format.
-        Include user stories and then  story mapping is compulsory, acceptance criteria, and technical constraints.
-        Format the output in a structured, professional requirements document."""
-        try:
-            if API_KEY:
-                llm = GoogleGenerativeAI(model="gemini-1.5-flash", api_key=API_KEY)
-                result = llm.invoke(prompt)
-                requirements = str(result) if result else "No response from LLM"
-            else:
-                st.error("API Key not found. Please set your Google API key in .env file")
-                return {"requirements": "Error: API Key required"}
-        except Exception as e:
-            st.error(f"Requirements Agent Error: {str(e)}")
-            requirements = f"Error in requirements generation: {str(e)}"
-        # Store and display completion
-        st.session_state.temp_requirements = requirements
-        display_agent_completion("Requirements Agent", "requirements")
-        # Handover message
-        add_communication("Requirements Agent", "✅ Requirements analysis complete! Handover to Design Agent with comprehensive requirements document.", "Design Agent", True)
-        return {"requirements": requirements}
-
-def DesignAgent(state):
-    st.session_state.current_agent = "Design Agent"
-    add_communication("Design Agent", "👋 Received handover from Requirements Agent. Starting system architecture design...")
-    
-    with st.spinner("🎨 Design Agent creating system architecture..."):
-        prompt = f"""You are a senior software architect with expertise in system design and Python development.
+def render_partial(placeholder, output_key, text):
+    """Show the output generated so far"""
+    if output_key in ["code", "tests"]:
+        placeholder.code(text, language="python")
+    else:
+        placeholder.markdown(text)
 
-        Based on these requirements:
-        {state['requirements']}
+# Stage order of the workflow
+STAGE_KEYS = ["requirements", "design", "code", "review", "tests", "verification", "deploy"]
+AGENT_NAMES = {
+    "requirements": "Requirements Agent",
+    "design": "Design Agent",
+    "code": "Development Agent",
+    "review": "Code Review Agent",
+    "tests": "Testing Agent",
+    "verification": "Verification Agent",
+    "deploy": "Deployment Agent"
+}
 
-        Design a comprehensive system architecture that includes:
-        - Detailed system architecture overview
-        - All required functions with input/output specifications
-        - Data structures and their relationships
-        - Program flow and user interaction patterns
-        - Error handling and validation strategies
-        - CLI interface design principles
-        - Security considerations
-        - Performance optimization approaches
-        
-        Provide a complete technical design document that a developer can directly implement from."""
-        try:
-            if API_KEY:
-                llm = GoogleGenerativeAI(model="gemini-1.5-flash", api_key=API_KEY)
-                result = llm.invoke(prompt)
-                design = str(result) if result else "No response from LLM"
-            else:
-                st.error("API Key not found. Please set your Google API key in .env file")
-                return {"design": "Error: API Key required"}
-        except Exception as e:
-            st.error(f"Design Agent Error: {str(e)}")
-            design = f"Error in design generation: {str(e)}"
-        st.session_state.temp_design = design
-        display_agent_completion("Design Agent", "design")
-        add_communication("Design Agent", "🎯 System architecture design completed! Handover to Development Agent with detailed technical blueprint.", "Development Agent", True)
-        return {"design": design}
+def start_new_run():
+    """Assign a fresh run id and remember it in the URL"""
+    st.session_state.run_id = uuid.uuid4().hex
+    st.query_params["run_id"] = st.session_state.run_id
 
-def DevAgent(state):
-    st.session_state.current_agent = "Development Agent"
-    add_communication("Development Agent", "💻 Received handover from Design Agent. Starting code implementation...")
-    
-    with st.spinner("⚡ Development Agent writing Python code..."):
-        prompt = f"""You are a senior Python developer with expertise in clean code and software craftsmanship.
-
-        Based on this system design:
-        {state['design']}
+@st.cache_resource
+def get_job_store():
+    """Job queue shared by all sessions, with this process's worker pool started once"""
+    store = JobStore()
+    if JOB_WORKERS > 0:
+        WorkerPool(store, JOB_WORKERS).start()
+    return store
 
-        Write complete, production-ready Python code for the CLI To-Do List application that includes:
-        
-        - Object-oriented design with proper class structure
-        - All functions specified in the design document
-        - Comprehensive error handling and input validation
-        - User-friendly CLI interface with clear menus and messages
-        - Proper data persistence during the session
-        - Clean, readable, and maintainable code
-        - Appropriate comments and documentation
-        - Following Python best practices and PEP 8 standards
-        
-        Provide ONLY the complete, executable Python code without any explanations or markdown formatting."""
-        try:
-            if API_KEY:
-                llm = GoogleGenerativeAI(model="gemini-1.5-flash", api_key=API_KEY)
-                result = llm.invoke(prompt)
-                code = str(result) if result else "No response from LLM"
-            else:
-                st.error("API Key not found. Please set your Google API key in .env file")
-                return {"code": "Error: API Key required"}
-        except Exception as e:
-            st.error(f"Development Agent Error: {str(e)}")
-            code = f"Error in code generation: {str(e)}"
-        st.session_state.temp_code = code
-        display_agent_completion("Development Agent", "code")
-        add_communication("Development Agent", "⚡ Code implementation finished! Handover to Code Review Agent for quality assurance and optimization.", "Code Review Agent", True)
-        return {"code": code}
-
-def CodeReviewAgent(state):
-    st.session_state.current_agent = "Code Review Agent"
-    add_communication("Code Review Agent", "🔍 Received handover from Development Agent. Conducting comprehensive code review...")
-    
-    with st.spinner("🔍 Code Review Agent analyzing code quality..."):
-        prompt = f"""You are a senior code reviewer and technical lead with expertise in Python development and software quality assurance.
+def communication_html(comm):
+    """HTML bubble for one message, built once when the message arrives"""
+    css_class = "handover-bubble" if comm["is_handover"] else "communication-bubble"
+    return f"""
+    <div class="{css_class}">
+        <small><strong>{comm['timestamp']}</strong></small><br>
+        <strong>{comm['agent']}:</strong><br>
+        {comm['message']}
+    </div>
+    """
 
-        Conduct a comprehensive code review of this Python application:
-        
-        {state['code']}
+def sync_job(store, job_id):
+    """Pull only what changed in a job into session state; returns (output status, changed)"""
+    job = store.get(job_id)
+    status = store.output_status(job_id)
+    changed = job["status"] != st.session_state.job_status or job["current_agent"] != st.session_state.current_agent
+    # Finished deliverables are fetched once, and again only if rewritten (e.g. by a fix round)
+    for key in STAGE_KEYS:
+        if key in status and status[key]["complete"] and st.session_state.output_versions.get(key) != status[key]["version"]:
+            st.session_state.agent_outputs[key] = status[key]["ref"]
+            st.session_state.output_versions[key] = status[key]["version"]
+            changed = True
+    for comm in store.messages(job_id, st.session_state.last_message_id):
+        comm["html"] = communication_html(comm)
+        st.session_state.agent_communications.append(comm)
+        st.session_state.last_message_id = comm["id"]
+        st.session_state.message_count += 1
+        changed = True
+    st.session_state.stream_stats = {
+        key: output["stats"]["stream"] for key, output in status.items() if "stream" in output["stats"]
+    }
+    st.session_state.context_savings = {
+        key: output["stats"]["context"] for key, output in status.items() if "context" in output["stats"]
+    }
+    st.session_state.speculation = status.get("speculation", {}).get("stats", {}).get("speculation")
+    # Written by whichever process ran the job, so the panel works with separate workers and after restarts
+    st.session_state.stage_records = sorted(status.get("metrics", {}).get("stats", {}).values(), key=lambda r: r["ts"])
+    st.session_state.current_agent = job["current_agent"]
+    st.session_state.job_status = job["status"]
+    st.session_state.workflow_complete = job["status"] == "done"
+    st.session_state.workflow_error = job["error"] if job["status"] == "failed" else None
+    update_progress()
+    return status, changed
 
-        Provide a detailed code review report that includes:
-        
-        1. **Code Quality Assessment**: Overall quality score and rationale
-        2. **Security Analysis**: Security vulnerabilities or concerns
-        3. **Performance Review**: Performance issues and optimization opportunities  
-        4. **Bug Detection**: Any bugs, logical errors, or edge cases not handled
-        5. **Best Practices**: Adherence to Python best practices and coding standards
-        6. **Maintainability**: Code structure, readability, and maintainability assessment
-        7. **Testing Recommendations**: Areas that need testing focus
-        8. **Improvement Suggestions**: Specific recommendations for enhancement
-        9. **Code Refactoring**: Any refactoring suggestions with examples
-        10. **Final Verdict**: Ready for production or needs modifications
-        
-        Provide actionable feedback that the development team can implement."""
-        try:
-            if API_KEY:
-                llm = GoogleGenerativeAI(model="gemini-1.5-flash", api_key=API_KEY)
-                result = llm.invoke(prompt)
-                review = str(result) if result else "No response from LLM"
-            else:
-                st.error("API Key not found. Please set your Google API key in .env file")
-                return {"review": "Error: API Key required"}
-        except Exception as e:
-            st.error(f"Code Review Agent Error: {str(e)}")
-            review = f"Error in code review: {str(e)}"
-        st.session_state.temp_review = review
-        display_agent_completion("Code Review Agent", "review")
-        add_communication("Code Review Agent", "✨ Code review completed with detailed analysis! Handover to Testing Agent for comprehensive test suite creation.", "Testing Agent", True)
-        return {"review": review}
+def paginate(text, page_chars=PAGE_CHARS):
+    """Split text into pages of about page_chars, breaking at line ends"""
+    pages, current, size = [], [], 0
+    for line in text.splitlines(keepends=True):
+        if current and size + len(line) > page_chars:
+            pages.append("".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    pages.append("".join(current))
+    return pages
 
-def TestingAgent(state):
-    st.session_state.current_agent = "Testing Agent"
-    add_communication("Testing Agent", "🧪 Received handover from Code Review Agent. Creating comprehensive test suite...")
-    
-    with st.spinner("🧪 Testing Agent writing unit tests..."):
-        prompt = f"""You are a senior QA engineer and test automation specialist with expertise in Python testing frameworks.
+def render_deliverable(key, text):
+    """Render one page of a deliverable so rerun cost doesn't grow with output size"""
+    pages = paginate(text) if len(text) > PAGE_CHARS else [text]
+    page = 1
+    if len(pages) > 1:
+        page = st.number_input(f"Page (of {len(pages)})", min_value=1, max_value=len(pages), key=f"page_{key}")
+    render_partial(st, key, pages[page - 1])
 
-        Based on the application code and code review feedback:
-        
-        CODE:
-        {state['code']}
-        
-        REVIEW FEEDBACK:
-        {state['review']}
+def edit_deliverable(store, key, text):
+    """Edit a finished deliverable and regenerate only the stages that depend on it"""
+    edited = st.text_area("Edited deliverable", value=text, height=300, key=f"edited_{key}")
+    stale = stale_nodes([key])
+    names = [NODE_AGENTS[node] for node in NODE_OUTPUTS if node in stale]
+    caption = f"♻️ Will regenerate: {', '.join(names)}" if names else "♻️ No later stage depends on this deliverable"
+    fixers = sorted({NODE_AGENTS[node] for node in loop_nodes([key])})
+    if fixers:
+        caption += f"; the {', '.join(fixers)} may also run another fix round, depending on the review's verdict"
+    if key in EXECUTED_KEYS and VERIFY_TESTS and not VERIFY_EDITS:
+        caption += "; the Verification Agent will not run hand-edited code or tests"
+    st.caption(caption)
+    if st.button("💾 Save & Regenerate", key=f"regenerate_{key}", disabled=edited == text):
+        store.resubmit(st.session_state.run_id, {key: edited})
+        st.session_state.agent_outputs = {}
+        st.session_state.output_versions = {}
+        st.session_state.job_status = "queued"
+        st.session_state.workflow_complete = False
+        st.session_state.pop(f"edited_{key}", None)
+        st.session_state.pop(f"editing_{key}", None)
+        st.rerun()
 
-        Create a comprehensive test suite using Python's unittest framework that includes:
-        
-        1. **Unit Tests**: Test all individual functions and methods
-        2. **Integration Tests**: Test component interactions
-        3. **Edge Case Testing**: Test boundary conditions and error scenarios
-        4. **Input Validation Tests**: Test all input validation logic
-        5. **Error Handling Tests**: Test error conditions and exception handling
-        6. **State Management Tests**: Test data persistence and state changes
-        7. **User Interface Tests**: Test CLI menu and user interaction flows
-        8. **Performance Tests**: Basic performance validation
-        9. **Regression Tests**: Tests to prevent future bugs
-        10. **Mock Tests**: Use mocks where appropriate for external dependencies
-        
-        Provide ONLY the complete, executable Python test code using unittest framework.
-        Include proper test setup, teardown, and comprehensive test coverage.
-        Follow testing best practices and naming conventions."""
-        try:
-            if API_KEY:
-                llm = GoogleGenerativeAI(model="gemini-1.5-flash", api_key=API_KEY)
-                result = llm.invoke(prompt)
-                tests = str(result) if result else "No response from LLM"
-            else:
-                st.error("API Key not found. Please set your Google API key in .env file")
-                return {"tests": "Error: API Key required"}
-        except Exception as e:
-            st.error(f"Testing Agent Error: {str(e)}")
-            tests = f"Error in test generation: {str(e)}"
-        st.session_state.temp_tests = tests
-        display_agent_completion("Testing Agent", "tests")
-        add_communication("Testing Agent", "🎉 Comprehensive test suite completed with full coverage! Handover to Deployment Agent for final deployment preparation.", "Deployment Agent", True)
-        return {"tests": tests}
+def prometheus_export():
+    """The Prometheus exports of this process and every worker, or this process's own if none is on disk"""
+    return combined_prometheus_text() or get_recorder().prometheus_text()
 
-def DeployAgent(state):
-    st.session_state.current_agent = "Deployment Agent"
-    add_communication("Deployment Agent", "🚀 Received handover from Testing Agent. Preparing deployment documentation and final package...")
-    
-    with st.spinner("🚀 Deployment Agent preparing final deployment..."):
-        prompt = f"""You are a senior DevOps engineer and deployment specialist with expertise in software delivery and documentation.
+def project_archive(refs, fmt):
+    """Open file of the exported project, streamed to disk from the artifact store; Streamlit reads it on click"""
+    return open(get_artifact_store().export_file(refs, fmt), "rb")
 
-        Based on the complete project deliverables:
-        
-        REQUIREMENTS: {state['requirements']}
-        DESIGN: {state['design']}  
-        CODE: {state['code']}
-        REVIEW: {state['review']}
-        TESTS: {state['tests']}
+def startup_report():
+    """Process start-up timings: imports, graph compile, first page render"""
+    compile_seconds = STARTUP.get("compile_seconds")
+    return " · ".join([
+        f"Imports {STARTUP['import_seconds'] * 1000:.0f} ms",
+        f"Graph compile {compile_seconds * 1000:.0f} ms" if compile_seconds is not None else "Graph compiles on first run",
+        f"First paint {STARTUP['first_paint_seconds'] * 1000:.0f} ms" if "first_paint_seconds" in STARTUP else "First paint pending",
+    ])
 
-        Create comprehensive deployment documentation and delivery package that includes:
-        
-        1. **Professional README**: Complete project documentation with features, installation, and usage
-        2. **System Requirements**: Detailed technical requirements and dependencies
-        3. **Installation Guide**: Step-by-step installation instructions for different platforms
-        4. **User Manual**: Comprehensive user guide with examples and screenshots
-        5. **Developer Guide**: Setup instructions for development environment
-        6. **Testing Instructions**: How to run tests and validate installation
-        7. **Troubleshooting Guide**: Common issues and their solutions
-        8. **Performance Specifications**: Performance benchmarks and optimization tips
-        9. **Security Guidelines**: Security considerations and best practices
-        10. **Version Information**: Release notes and version history
-        11. **Support Information**: How to get help and report issues
-        12. **License and Legal**: Licensing information and legal notices
-        
-        Create production-ready documentation that enables easy deployment and maintenance.
-        Format as a professional software release package."""
-        try:
-            if API_KEY:
-                llm = GoogleGenerativeAI(model="gemini-1.5-flash", api_key=API_KEY)
-                result = llm.invoke(prompt)
-                deploy = str(result) if result else "No response from LLM"
-            else:
-                st.error("API Key not found. Please set your Google API key in .env file")
-                return {"deploy": "Error: API Key required"}
-        except Exception as e:
-            st.error(f"Deployment Agent Error: {str(e)}")
-            deploy = f"Error in deployment documentation: {str(e)}"
-        st.session_state.temp_deploy = deploy
-        display_agent_completion("Deployment Agent", "deploy")
-        add_communication("Deployment Agent", "✅ Deployment preparation completed successfully! Full SDLC workflow finished - Project ready for production release! 🎉", None, True)
-        st.session_state.workflow_complete = True
-        return {"deploy": deploy}
+def live_progress(store, job_id):
+    """Status and streamed output of the running job, refreshed on its own"""
+    status, changed = sync_job(store, job_id)
+    if changed:
+        # A stage finished or a message arrived: redraw the page once
+        st.rerun()
+    if st.session_state.job_status == "queued":
+        st.info("⏳ Workflow queued, waiting for a free worker...")
+    else:
+        st.info(f"🔄 {st.session_state.current_agent or 'Workflow'} working...")
+    # Deliverables still being generated, as streamed so far
+    for key in STAGE_KEYS:
+        if key in status and not status[key]["complete"] and status[key]["chars"]:
+            st.markdown(f"**✍️ {AGENT_NAMES[key]} (in progress)**")
+            render_partial(st, key, store.output_text(job_id, key)[-PAGE_CHARS:])
 
-# Create the LangGraph workflow
-def create_workflow():
-    graph = StateGraph(BuildState)
-    
-    graph.add_node("Requirements", RequirementsAgent)
-    graph.add_node("Design", DesignAgent)
-    graph.add_node("Dev", DevAgent)
-    graph.add_node("Review", CodeReviewAgent)
-    graph.add_node("Testing", TestingAgent)
-    graph.add_node("Deploy", DeployAgent)
-    
-    graph.set_entry_point("Requirements")
-    graph.add_edge("Requirements", "Design")
-    graph.add_edge("Design", "Dev")
-    graph.add_edge("Dev", "Review")
-    graph.add_edge("Review", "Testing")
-    graph.add_edge("Testing", "Deploy")
-    graph.set_finish_point("Deploy")
-    
-    return graph.compile()
+def stage_summary(key):
+    """One-line timing and context stats for a finished stage"""
+    parts = []
+    stats = st.session_state.stream_stats.get(key)
+    if stats:
+        parts.append(f"⏱️ First token {stats['ttft']:.2f}s · {stats['tokens_per_sec']:.1f} tokens/s")
+        if stats.get("stopped_early"):
+            parts.append("✂️ Generation stopped once the module was complete")
+    savings = st.session_state.context_savings.get(key)
+    if savings and savings["original"] > savings["compacted"]:
+        parts.append(f"📉 Context {savings['original']:,} → {savings['compacted']:,} tokens (saved {savings['original'] - savings['compacted']:,})")
+    # The code's fix rounds report under their patch
+    if key == "code" and ("code_diff" in st.session_state.stream_stats or "code_diff" in st.session_state.context_savings):
+        parts.append(f"🛠️ Last fix round: {stage_summary('code_diff') or 'no stats'}")
+    return " · ".join(parts)
 
 # Main UI Function
 def main():
@@ -435,29 +336,76 @@ def main():
     """, unsafe_allow_html=True)
     
     # API Key Check
-    if not API_KEY:
+    if not LLM_READY:
         st.error("⚠️ Google API Key not found! Please add your API key to the .env file:")
         st.code("api_key=your_google_api_key_here")
         st.stop()
     
+    # The run itself happens in a background job; this script only reads its progress
+    store = get_job_store()
+    if st.session_state.run_id and store.get(st.session_state.run_id):
+        # Also reattaches to a run named in the URL after a reconnect or restart
+        st.session_state.workflow_started = True
+        sync_job(store, st.session_state.run_id)
+    
     # Sidebar
     with st.sidebar:
         st.header("🎯 Workflow Control")
+        if LLM_BACKEND == "replay":
+            st.caption(f"▶️ Replaying `{REPLAY_TRACE}` at {REPLAY_SPEED:g}x; no model is called")
         
         if not st.session_state.workflow_started:
             if st.button("🚀 Start Multi-Agent Workflow", type="primary"):
                 st.session_state.workflow_started = True
+                start_new_run()
+                store.submit(DEFAULT_SPEC, {
+                    "bypass_cache": st.session_state.get("bypass_cache", False),
+                    "stream": st.session_state.get("stream_output", True),
+                    "speculate": st.session_state.get("speculate", SPECULATE),
+                }, job_id=st.session_state.run_id)
                 st.rerun()
         else:
+            if st.session_state.workflow_error and st.button("🔁 Retry Failed Stage", type="primary"):
+                # Completed stages stay checkpointed; only the failed one runs again
+                store.retry(st.session_state.run_id)
+                st.rerun()
             if st.button("🔄 Reset Workflow"):
                 # Reset all session state
                 for key in list(st.session_state.keys()):
                     del st.session_state[key]
+                st.query_params.clear()
                 st.rerun()
         
+        st.checkbox("Bypass LLM cache for this run", key="bypass_cache", disabled=st.session_state.workflow_started)
+        st.checkbox("Stream agent output", value=True, key="stream_output", disabled=st.session_state.workflow_started)
+        st.checkbox("⚡ Speculative pipelining", value=SPECULATE, key="speculate", disabled=st.session_state.workflow_started,
+                    help="Start Design and Development from a partial upstream stream; restarted if it changes")
+        saved = sum(v["original"] - v["compacted"] for v in st.session_state.context_savings.values())
+        if saved:
+            st.caption(f"📉 Context budgets saved {saved:,} prompt tokens this run")
+        speculation = st.session_state.speculation
+        if speculation:
+            st.caption(f"⚡ Speculation hid {speculation['hidden_seconds']:.1f}s, wasted {speculation['wasted_seconds']:.1f}s"
+                       + (f" ({', '.join(speculation['restarted'])} restarted)" if speculation["restarted"] else ""))
+        cache_stats = get_llm_cache().stats()
+        st.caption(f"🗄️ LLM cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses · {cache_stats['entries']} entries ({cache_stats['bytes'] // 1024} KB)")
+        flights = get_single_flight().stats()
+        if flights["coalesced"]:
+            st.caption(f"🔗 {flights['coalesced']} LLM calls shared an identical call already in flight ({flights['leaders']} made)")
+        
+        if st.session_state.workflow_complete:
+            refs = dict(st.session_state.agent_outputs)
+            # Archives are built only when a button is clicked
+            st.download_button("📦 Download Project (.zip)", data=lambda: project_archive(refs, "zip"),
+                               file_name="project.zip", mime="application/zip", on_click="ignore")
+            st.download_button("📦 Download Project (.tar.gz)", data=lambda: project_archive(refs, "tar.gz"),
+                               file_name="project.tar.gz", mime="application/gzip", on_click="ignore")
+        with st.expander("⏱️ Startup"):
+            st.caption(startup_report())
+        
         st.markdown("---")
         st.header("📘 About This Project")
-        st.markdown("""
+        st.markdown(minified("""
         <div style="background: linear-gradient(135deg, #232526 0%, #414345 100%); border-radius: 12px; padding: 1.5rem; color: #fff; margin-bottom: 1rem; box-shadow: 0 2px 8px rgba(0,0,0,0.08);">
             <h3 style="margin-top:0; margin-bottom: 0.5rem; font-size: 1.3rem; letter-spacing: 1px;">
                 <span style="font-size:1.5rem; vertical-align:middle;">🚀</span> <b>Multi-Agent SDLC Workflow</b> <span style="font-size:0.95rem; color:#b3b3b3;">(Waterfall Model)</span>
@@ -473,6 +421,7 @@ def main():
                     <li><b>Development Agent</b> <span style='color:#fbbf24;'>💻</span>: Implements the application code according to the design.</li>
                     <li><b>Code Review Agent</b> <span style='color:#f472b6;'>🔍</span>: Reviews the code for quality, security, and best practices.</li>
                     <li><b>Testing Agent</b> <span style='color:#34d399;'>🧪</span>: Develops and runs comprehensive tests to ensure code quality.</li>
+                    <li><b>Verification Agent</b> <span style='color:#fbbf24;'>🧫</span>: Runs the generated tests against the generated code.</li>
                     <li><b>Deployment Agent</b> <span style='color:#818cf8;'>🚀</span>: Prepares deployment documentation and final release package.</li>
                 </ul>
             </div>
@@ -484,7 +433,7 @@ def main():
                 </p>
             </div>
         </div>
-        """, unsafe_allow_html=True)
+        """), unsafe_allow_html=True)
     
     # Main content
     col1, col2 = st.columns([2, 1])
@@ -492,65 +441,79 @@ def main():
     with col1:
         st.header("🔄 Agent Workflow Progress")
         
-        if st.session_state.workflow_started and not st.session_state.workflow_complete:
-            # Run workflow step by step
-            app = create_workflow()
-            
-            try:
-                final_output = app.invoke({
-                    "requirements": "",
-                    "design": "",
-                    "code": "",
-                    "review": "",
-                    "tests": "",
-                    "deploy": ""
-                })
-                st.success("🎉 Multi-Agent Workflow completed successfully!")
+        if st.session_state.workflow_error:
+            st.error(f"Workflow stopped: {st.session_state.workflow_error}")
+        elif st.session_state.workflow_complete:
+            st.success("🎉 Multi-Agent Workflow completed successfully!")
+            if not st.session_state.get("celebrated"):
+                st.session_state.celebrated = True
                 st.balloons()
-            except Exception as e:
-                st.error(f"Workflow Error: {str(e)}")
+        elif st.session_state.workflow_started:
+            # Only this fragment reruns while the job is in flight; the rest of the page is left alone
+            st.fragment(live_progress, run_every=POLL_SECONDS)(store, st.session_state.run_id)
         
         # Display agent outputs
         if st.session_state.agent_outputs:
             st.header("📋 Agent Deliverables")  
             
-            agent_names = {
-                "requirements": "Requirements Agent",
-                "design": "Design Agent", 
-                "code": "Development Agent",
-                "review": "Code Review Agent",
-                "tests": "Testing Agent",
-                "deploy": "Deployment Agent"
-            }
-            
-            for key, output in st.session_state.agent_outputs.items():
-                agent_name = agent_names.get(key, key.title())
+            for key in [k for k in STAGE_KEYS if k in st.session_state.agent_outputs]:
+                agent_name = AGENT_NAMES.get(key, key.title())
                 is_active = st.session_state.current_agent == agent_name
                 
-                with st.expander(f"{'🔄' if is_active else '✅'} {agent_name} - Deliverables", expanded=is_active):
+                panel = st.expander(f"{'🔄' if is_active else '✅'} {agent_name} - Deliverables", expanded=is_active,
+                                    key=f"open_{key}", on_change="rerun")
+                if not panel.open:
+                    # Collapsed deliverables are never read from disk
+                    continue
+                output = get_artifact_store().get(st.session_state.agent_outputs[key])
+                with panel:
                     st.markdown(f"**Agent:** {agent_name}")
+                    if stage_summary(key):
+                        st.caption(stage_summary(key))
                     st.markdown("**Output:**")
-                    if key in ["code", "tests"]:
-                        st.code(output, language="python")
-                    else:
-                        st.markdown(output)
+                    render_deliverable(key, output)
+                    if st.session_state.workflow_complete and st.toggle("✏️ Edit", key=f"editing_{key}"):
+                        edit_deliverable(store, key, output)
     
     with col2:
         st.header("💬 Agent Communications")
         
         if st.session_state.agent_communications:
-            for comm in st.session_state.agent_communications:
-                css_class = "handover-bubble" if comm["is_handover"] else "communication-bubble"
-                st.markdown(f"""
-                <div class="{css_class}">
-                    <small><strong>{comm['timestamp']}</strong></small><br>
-                    <strong>{comm['agent']}:</strong><br>
-                    {comm['message']}
-                </div>
-                """, unsafe_allow_html=True)
+            hidden = st.session_state.message_count - len(st.session_state.agent_communications)
+            if hidden:
+                st.caption(f"{hidden} earlier messages not shown")
+            # One element for the whole log instead of one per message
+            st.markdown("".join(comm["html"] for comm in st.session_state.agent_communications), unsafe_allow_html=True)
         else:
             st.info("No communications yet. Start the workflow to see agent interactions!")
         
+        # Per-stage performance metrics of this run
+        st.header("📊 Stage Metrics")
+        recorder = get_recorder()
+        records = st.session_state.stage_records if st.session_state.run_id else []
+        if records:
+            st.dataframe([{
+                "Stage": r["node"],
+                "Model": r.get("model", ""),
+                "Wall (s)": round(r["wall_seconds"], 2),
+                "Queue (s)": round(r["queue_seconds"], 2),
+                "LLM (s)": round(r["llm_seconds"], 2),
+                "Prompt tok": r["prompt_tokens"],
+                "Output tok": r["completion_tokens"],
+                "Cache hits": r["cache_hits"],
+                "Retries": r["retries"],
+                "Errors": r["errors"],
+                "Fallbacks": r.get("fallbacks", 0),
+            } for r in records], hide_index=True)
+            slowest = max(records, key=lambda r: r["wall_seconds"])
+            st.caption(f"Slowest stage: {slowest['node']} ({slowest['wall_seconds']:.2f}s). Exported to `{recorder.jsonl_path}` and `{PROM_GLOB}` (one file per process).")
+            fell_back = list(dict.fromkeys(r["node"] for r in records if r.get("fallbacks")))
+            if fell_back:
+                st.caption(f"🔀 {', '.join(fell_back)} used the fallback model (primary latency or error rate over threshold)")
+            st.download_button("⬇️ Prometheus metrics", prometheus_export, file_name="metrics.prom", mime="text/plain", on_click="ignore")
+        else:
+            st.info("Metrics appear here once agents start running.")
+        
         # Workflow completion summary
         if st.session_state.workflow_complete:
             st.markdown("""
@@ -562,4 +525,8 @@ def main():
             """, unsafe_allow_html=True)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    if "first_paint_seconds" not in STARTUP:
+        # The first script run of this process
+        record_startup("first_paint_seconds", time.perf_counter() - SCRIPT_START)
+        logging.getLogger("startup").info(startup_report())
\ No newline at end of file
@@ -0,0 +1,84 @@
+import difflib
+import re
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+\d+(?:,(\d+))? @@")
+# Fences start at column 0; a hunk line always starts with " ", "+" or "-", even when its text is a fence
+FENCE = re.compile(r"^```(?:diff|patch)?[ \t]*\n(.*?)^```[ \t]*$", re.DOTALL | re.MULTILINE)
+
+
+class PatchError(Exception):
+    """A diff that does not apply to the text it was made for"""
+
+
+def unified_diff(old, new, context=3, name="app.py"):
+    """Unified diff from old to new, empty when they are the same"""
+    return "".join(difflib.unified_diff(
+        old.splitlines(keepends=True), new.splitlines(keepends=True),
+        f"a/{name}", f"b/{name}", n=context,
+    ))
+
+
+def parse_hunks(diff):
+    """[(old_start, old_lines, new_lines)] for each hunk of a unified diff"""
+    blocks = FENCE.findall(diff)
+    lines = ("\n".join(blocks) if blocks else diff).splitlines()
+    hunks, current = [], None
+    old_left = new_left = 0
+    for line in lines:
+        header = HUNK_HEADER.match(line)
+        if header:
+            current = (int(header.group(1)), [], [])
+            hunks.append(current)
+            old_left, new_left = (int(count) if count else 1 for count in header.group(2, 3))
+        elif current is None or line.startswith("\\"):
+            continue
+        elif line.startswith(("---", "+++")) and old_left <= 0 and new_left <= 0:
+            # A file header; inside a hunk such a line is a removed "--..." or added "++..." line
+            continue
+        elif line.startswith("-"):
+            current[1].append(line[1:])
+            old_left -= 1
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+            new_left -= 1
+        else:
+            # Context line; some models drop the leading space on blank lines
+            current[1].append(line[1:] if line.startswith(" ") else line)
+            current[2].append(line[1:] if line.startswith(" ") else line)
+            old_left -= 1
+            new_left -= 1
+    return hunks
+
+
+def find_block(lines, block, start, hint):
+    """Index of block in lines at or after start, preferring the spot nearest hint"""
+    def matches(at, normalize):
+        return all(normalize(lines[at + i]) == normalize(b) for i, b in enumerate(block))
+
+    candidates = range(start, len(lines) - len(block) + 1)
+    # Line numbers in generated diffs are often off; exact text first, then ignoring whitespace
+    for normalize in (lambda s: s, lambda s: " ".join(s.split())):
+        found = [at for at in candidates if matches(at, normalize)]
+        if found:
+            return min(found, key=lambda at: abs(at - hint))
+    return None
+
+
+def apply_diff(text, diff):
+    """Apply a unified diff to text, locating hunks by content rather than line numbers"""
+    hunks = parse_hunks(diff)
+    if not hunks:
+        raise PatchError("no hunks found")
+    lines = text.splitlines()
+    cursor, offset = 0, 0
+    for old_start, old_lines, new_lines in hunks:
+        if not old_lines:
+            at = min(max(old_start + offset, cursor), len(lines))
+        else:
+            at = find_block(lines, old_lines, cursor, old_start - 1 + offset)
+            if at is None:
+                raise PatchError(f"hunk at line {old_start} does not match the code")
+        lines[at:at + len(old_lines)] = new_lines
+        cursor = at + len(new_lines)
+        offset += len(new_lines) - len(old_lines)
+    return "\n".join(lines) + ("\n" if text.endswith("\n") else "")
@@ -0,0 +1,95 @@
+import asyncio
+import random
+import threading
+import time
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = {
+    "ResourceExhausted",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "DeadlineExceeded",
+    "InternalServerError",
+    "RateLimitError",
+}
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate_per_minute; callers hold the limiter lock"""
+
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity or rate_per_minute)
+        self.clock = clock
+        self.level = self.capacity
+        self.updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount is available (the level may be negative after a charge)"""
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    """Process-wide requests/min and tokens/min limits shared by every session"""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+
+    async def acquire(self, tokens):
+        """Wait for one request slot and tokens; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self.requests.refill()
+                self.tokens.refill()
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait <= 0:
+                    self.requests.level -= 1
+                    self.tokens.level -= min(tokens, self.tokens.capacity)
+                    return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def charge(self, tokens):
+        """Debit completion tokens once the response is known; the bucket may go into debt"""
+        with self._lock:
+            self.tokens.refill()
+            self.tokens.level -= tokens
+
+
+def is_retryable(exc):
+    """Rate limits, timeouts and transient server errors are worth retrying"""
+    if isinstance(exc, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    if type(exc).__name__ in RETRYABLE_NAMES:
+        return True
+    for attr in ("code", "status_code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int) and value in RETRYABLE_STATUS:
+            return True
+    message = str(exc).lower()
+    return "429" in message or "rate limit" in message or "resource exhausted" in message
+
+
+async def retry_with_backoff(call, max_retries=4, base_delay=1.0, max_delay=30.0, on_retry=None):
+    """Await call(), retrying retryable errors with exponential backoff and full jitter"""
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            attempt += 1
+            if on_retry:
+                on_retry(attempt, delay, e)
+            await asyncio.sleep(delay)
@@ -0,0 +1,150 @@
+"""Per-stage model routing with latency-aware fallback.
+
+Each node has its own model, output token limit and temperature. Every call's
+latency and outcome is tracked per backend; when a backend's recent p95
+latency or error rate crosses its threshold, calls go to the fallback route
+until a cooldown has passed, after which the primary is tried again.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+# Model and generation settings per node; anything a route leaves out comes from the default route
+STAGE_ROUTES = {
+    "Requirements": {"max_output_tokens": 4096, "temperature": 0.4},
+    "Design": {"max_output_tokens": 4096, "temperature": 0.3},
+    # Writing and patching code needs the most capable model
+    "Dev": {"model": "gemini-1.5-pro", "max_output_tokens": 8192, "temperature": 0.2},
+    "Fix": {"model": "gemini-1.5-pro", "max_output_tokens": 4096, "temperature": 0.1},
+    # Review and deployment notes are mostly summarization
+    "Review": {"model": "gemini-1.5-flash-8b", "max_output_tokens": 2048, "temperature": 0.2},
+    "Testing": {"max_output_tokens": 4096, "temperature": 0.2},
+    "Deploy": {"model": "gemini-1.5-flash-8b", "max_output_tokens": 2048, "temperature": 0.3},
+}
+
+# Routes can be overridden from .env, e.g. model_routes={"Dev": {"model": "gemini-1.5-flash"}}
+ROUTE_OVERRIDES = json.loads(os.getenv("model_routes", "{}"))
+
+# When to switch a backend to its fallback, judged over its last TRACKER_WINDOW calls
+FALLBACK_P95_SECONDS = float(os.getenv("fallback_p95_seconds", "60"))
+FALLBACK_ERROR_RATE = float(os.getenv("fallback_error_rate", "0.5"))
+FALLBACK_MIN_CALLS = int(os.getenv("fallback_min_calls", "4"))
+FALLBACK_COOLDOWN_SECONDS = float(os.getenv("fallback_cooldown", "120"))
+TRACKER_WINDOW = 20
+
+
+def backend_key(route):
+    """Name a route's backend is tracked under"""
+    return f"{route.get('backend')}:{route['model']}"
+
+
+class LatencyTracker:
+    """Rolling latency and error rate of each backend over its most recent calls"""
+
+    def __init__(self, window=TRACKER_WINDOW):
+        self.window = window
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, ok):
+        with self._lock:
+            self._calls.setdefault(name, deque(maxlen=self.window)).append((seconds, ok))
+
+    def reset(self, name):
+        with self._lock:
+            self._calls.pop(name, None)
+
+    def stats(self, name):
+        """{"calls", "p95_seconds", "error_rate"} over the window"""
+        with self._lock:
+            calls = list(self._calls.get(name, ()))
+        latencies = sorted(seconds for seconds, ok in calls if ok)
+        p95 = latencies[math.ceil(0.95 * len(latencies)) - 1] if latencies else 0.0
+        errors = sum(1 for _, ok in calls if not ok)
+        return {"calls": len(calls), "p95_seconds": p95, "error_rate": errors / len(calls) if calls else 0.0}
+
+    def snapshot(self):
+        with self._lock:
+            names = list(self._calls)
+        return {name: self.stats(name) for name in names}
+
+
+class ModelRouter:
+    """Picks the backend for each node's calls, falling back while the primary is unhealthy"""
+
+    def __init__(self, default_route, fallback_route, factory, routes=None, tracker=None,
+                 p95_seconds=FALLBACK_P95_SECONDS, error_rate=FALLBACK_ERROR_RATE,
+                 min_calls=FALLBACK_MIN_CALLS, cooldown_seconds=FALLBACK_COOLDOWN_SECONDS, clock=time.monotonic):
+        self.default_route = default_route
+        self.fallback_route = fallback_route
+        self.factory = factory
+        self.routes = routes if routes is not None else {
+            node: {**STAGE_ROUTES.get(node, {}), **ROUTE_OVERRIDES.get(node, {})}
+            for node in {*STAGE_ROUTES, *ROUTE_OVERRIDES}
+        }
+        self.tracker = tracker or LatencyTracker()
+        self.p95_seconds = p95_seconds
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown_seconds = cooldown_seconds
+        self.clock = clock
+        self._tripped = {}
+        self._lock = threading.Lock()
+
+    def route(self, node):
+        """Primary route of a node: model, backend and generation settings"""
+        return {**self.default_route, **self.routes.get(node, {})}
+
+    def fallback(self, node):
+        """The node's route with its model swapped for the fallback one (the default one if it already uses that)"""
+        route = self.route(node)
+        fallback = {**route, **self.fallback_route}
+        if backend_key(fallback) == backend_key(route):
+            fallback = {**route, **self.default_route}
+        return fallback
+
+    def without_fallback(self, nodes):
+        """Nodes whose fallback is their primary model, so they can never fall back"""
+        return [node for node in nodes if backend_key(self.route(node)) == backend_key(self.fallback(node))]
+
+    def healthy(self, name):
+        """False while a backend is over a threshold or cooling down after it was"""
+        now = self.clock()
+        with self._lock:
+            tripped = self._tripped.get(name)
+            if tripped is not None:
+                if now - tripped < self.cooldown_seconds:
+                    return False
+                # Cooled down: give the primary a fresh window
+                del self._tripped[name]
+                self.tracker.reset(name)
+                return True
+            stats = self.tracker.stats(name)
+            if stats["calls"] >= self.min_calls and (
+                stats["p95_seconds"] > self.p95_seconds or stats["error_rate"] > self.error_rate
+            ):
+                self._tripped[name] = now
+                return False
+            return True
+
+    def select(self, node):
+        """(backend, route, is_fallback) for the next call of node"""
+        route = self.route(node)
+        fallback = self.fallback(node)
+        if backend_key(route) != backend_key(fallback) and not self.healthy(backend_key(route)):
+            return self.factory(fallback), fallback, True
+        return self.factory(route), route, False
+
+    def observe(self, route, seconds, ok):
+        """Record the latency and outcome of one call made on route"""
+        self.tracker.record(backend_key(route), seconds, ok)
+
+    def status(self):
+        """Rolling stats of every backend used so far, with whether it is currently bypassed"""
+        with self._lock:
+            tripped = set(self._tripped)
+        return {name: {**stats, "bypassed": name in tripped} for name, stats in self.tracker.snapshot().items()}
@@ -0,0 +1,187 @@
+"""Speculative pipelining: start a node from a partial upstream stream.
+
+When the stream of a node's input reaches a configured trigger (a finished
+section, or a number of characters), the node is started in the background
+on that prefix, with its hook calls held back. When the node's turn comes the
+result is used if the part of the final input it was based on is unchanged;
+otherwise the speculative run is cancelled and the node runs normally.
+"""
+
+import asyncio
+import time
+from contextlib import nullcontext
+
+from artifacts import get_artifact_store
+from context_budget import HEADING, split_sections
+from telemetry import COUNTERS, new_stage_record, track_stage
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+def trigger_prefix(trigger, text):
+    """(prefix, basis) once text satisfies trigger, else None"""
+    keywords = trigger.get("sections")
+    if keywords:
+        # Every section but the last is finished: a later heading has started
+        finished = split_sections(text)[:-1]
+        if any(k in h.lower() for h, _ in finished for k in keywords):
+            lines = text.splitlines(keepends=True)
+            last_heading = max(i for i, line in enumerate(lines) if HEADING.match(line.strip()))
+            # The node sees every finished section, so all of them must be unchanged for its result to stand
+            return "".join(lines[:last_heading]), [(h, normalize(b)) for h, b in finished]
+    limit = trigger.get("prefix_chars")
+    if limit and len(text) >= limit:
+        cut = text.rfind("\n", 0, limit) + 1 or limit
+        return text[:cut], normalize(text[:cut])
+    return None
+
+
+def basis_of(basis, text):
+    """The part of text that corresponds to a basis taken from a prefix of it"""
+    if isinstance(basis, list):
+        return [(h, normalize(b)) for h, b in split_sections(text)[:len(basis)]]
+    return normalize(text)[:len(basis)]
+
+
+class FeedingHooks:
+    """Hooks of a running node that also pass its stream to the registry"""
+
+    def __init__(self, inner, registry, state):
+        self.inner = inner
+        self.registry = registry
+        self.state = state
+
+    def partial_output(self, output_key, text):
+        self.inner.partial_output(output_key, text)
+        self.registry.on_partial(self.state, output_key, text)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+class BufferedHooks:
+    """Hooks of a speculative run: calls are held back and replayed only if its result is used"""
+
+    def __init__(self, registry, state):
+        self.registry = registry
+        self.state = state
+        self.calls = []
+
+    def partial_output(self, output_key, text):
+        # Speculation can chain: this run's stream may start the node after it
+        self.registry.on_partial(self.state, output_key, text)
+
+    def working(self, message):
+        return nullcontext()
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def replay(self, hooks):
+        for name, args, kwargs in self.calls:
+            getattr(hooks, name)(*args, **kwargs)
+
+
+class Speculation:
+    """Speculative runs of one workflow run, and the time they hid or wasted"""
+
+    def __init__(self, triggers, agents, outputs, view):
+        self.triggers = triggers
+        self.agents = agents
+        self.outputs = outputs
+        self.view = view
+        self.settings = {}
+        self.runs = {}
+        self.used = set()
+        self.hidden = 0.0
+        self.wasted = 0.0
+        self.accepted = []
+        self.restarted = []
+
+    def bind(self, config, state, hooks):
+        """Config for a node's real run, feeding its stream to the registry"""
+        self.settings = config.get("configurable", {})
+        return {**config, "configurable": {**self.settings, "hooks": FeedingHooks(hooks, self, state)}}
+
+    def on_partial(self, state, output_key, text):
+        for node, trigger in self.triggers.items():
+            if trigger["input"] != output_key or node in self.runs or node in self.used:
+                continue
+            ready = trigger_prefix(trigger, text)
+            if ready:
+                self.launch(node, trigger, state, *ready)
+
+    def launch(self, node, trigger, state, prefix, basis):
+        spec_state = {**state, trigger["input"]: prefix}
+        hooks = BufferedHooks(self, spec_state)
+        config = {"configurable": {**self.settings, "hooks": hooks}}
+        record = new_stage_record(self.settings.get("thread_id"), node)
+        agent = self.agents[node]
+
+        async def run():
+            with track_stage(record):
+                return await agent(self.view(spec_state), config)
+
+        entry = {"input": trigger["input"], "basis": basis, "hooks": hooks, "record": record,
+                 "started": time.time(), "finished": None}
+        entry["task"] = asyncio.get_running_loop().create_task(run())
+        entry["task"].add_done_callback(lambda _: entry.update(finished=time.time()))
+        self.runs[node] = entry
+
+    def cancel(self, node, now):
+        """Drop a speculative run, and any run started from its stream"""
+        entry = self.runs.pop(node, None)
+        if entry is None:
+            return
+        entry["task"].cancel()
+        self.wasted += (entry["finished"] or now) - entry["started"]
+        for other, trigger in self.triggers.items():
+            if trigger["input"] == self.outputs.get(node):
+                self.cancel(other, now)
+
+    async def claim(self, node, state, hooks, agent_name, record):
+        """The node's update from its speculative run if still valid, else None"""
+        entry = self.runs.get(node)
+        if entry is None:
+            return None
+        now = time.time()
+        final = get_artifact_store().get(state.get(entry["input"]) or "")
+        if basis_of(entry["basis"], final) != entry["basis"]:
+            self.cancel(node, now)
+            self.restarted.append(node)
+            hooks.communicate(agent_name, f"↩️ Upstream {entry['input']} changed after the speculative start; running again on the final version.")
+            return None
+        try:
+            update = await entry["task"]
+        except Exception:
+            # A speculative failure costs its time; the real run decides whether the stage fails
+            self.runs.pop(node, None)
+            self.wasted += (entry["finished"] or time.time()) - entry["started"]
+            self.restarted.append(node)
+            return None
+        self.runs.pop(node)
+        self.used.add(node)
+        # A task that just finished may not have run its done callback yet
+        hidden = min(entry["finished"] or now, now) - entry["started"]
+        self.hidden += hidden
+        self.accepted.append(node)
+        for name in COUNTERS + ["llm_seconds"]:
+            record[name] += entry["record"][name]
+        record["model"] = entry["record"]["model"]
+        entry["hooks"].replay(hooks)
+        hooks.communicate(agent_name, f"⚡ Started early from a partial {entry['input']}; {hidden:.1f}s of its work overlapped upstream stages.")
+        return update
+
+    def close(self):
+        """Cancel what was never used and report hidden versus wasted time"""
+        now = time.time()
+        for node in list(self.runs):
+            self.cancel(node, now)
+        return {
+            "hidden_seconds": round(self.hidden, 3),
+            "wasted_seconds": round(self.wasted, 3),
+            "accepted": self.accepted,
+            "restarted": self.restarted,
+        }
@@ -0,0 +1,144 @@
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Metrics of the stage running in the current task, filled in by the LLM call path
+_current_stage = ContextVar("current_stage", default=None)
+
+# One-off process start-up timings (imports, graph compile, first page render)
+STARTUP = {}
+
+COUNTERS = ["prompt_tokens", "completion_tokens", "cache_hits", "retries", "errors", "fallbacks", "coalesced"]
+TIMERS = ["wall_seconds", "queue_seconds", "llm_seconds"]
+# Every process (app, each jobs.py worker) exports its own counters to its own file, labelled with its pid,
+# so one process's totals never replace another's; a textfile collector or combined_prometheus_text reads them all
+PROM_PATH = "metrics-{pid}.prom"
+PROM_GLOB = "metrics-*.prom"
+
+
+def record_startup(name, seconds):
+    """Record a start-up timing; only the first measurement of each counts"""
+    STARTUP.setdefault(name, seconds)
+
+
+def new_stage_record(run_id, node):
+    record = {"ts": time.time(), "run_id": run_id, "node": node, "model": ""}
+    record.update({name: 0 for name in COUNTERS})
+    record.update({name: 0.0 for name in TIMERS})
+    return record
+
+
+def stage_metrics():
+    """Metrics record of the running stage (a throwaway one outside instrumented stages)"""
+    record = _current_stage.get()
+    return record if record is not None else new_stage_record(None, None)
+
+
+@contextmanager
+def track_stage(record):
+    """Make record the target of stage_metrics() for the duration of a stage"""
+    token = _current_stage.set(record)
+    try:
+        yield record
+    finally:
+        _current_stage.reset(token)
+
+
+class MetricsRecorder:
+    """Keeps recent stage records and exports them as JSONL and Prometheus text"""
+
+    def __init__(self, jsonl_path="metrics.jsonl", prom_path=PROM_PATH, keep=1000):
+        self.pid = os.getpid()
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path.format(pid=self.pid) if prom_path else prom_path
+        self.records = deque(maxlen=keep)
+        self.totals = defaultdict(lambda: defaultdict(float))
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        """Add a finished stage record and refresh both exports"""
+        with self._lock:
+            self.records.append(record)
+            totals = self.totals[record["node"]]
+            totals["calls"] += 1
+            for name in COUNTERS + TIMERS:
+                totals[name] += record[name]
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            if self.prom_path:
+                # Replace atomically so a scraper never reads a half-written file
+                tmp_path = self.prom_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(self._prometheus_text())
+                os.replace(tmp_path, self.prom_path)
+
+    def recent(self, run_id=None):
+        """Records of one run, or all kept records"""
+        with self._lock:
+            return [r for r in self.records if run_id is None or r["run_id"] == run_id]
+
+    def prometheus_text(self):
+        with self._lock:
+            return self._prometheus_text()
+
+    def _prometheus_text(self):
+        metrics = [
+            ("sdlc_stage_calls_total", "counter", "Agent stage executions", "calls"),
+            ("sdlc_stage_wall_seconds_total", "counter", "Wall time spent in agent stages", "wall_seconds"),
+            ("sdlc_stage_queue_seconds_total", "counter", "Time stages waited after their inputs were ready", "queue_seconds"),
+            ("sdlc_stage_llm_seconds_total", "counter", "Time spent waiting on the LLM", "llm_seconds"),
+            ("sdlc_stage_prompt_tokens_total", "counter", "Estimated prompt tokens sent", "prompt_tokens"),
+            ("sdlc_stage_completion_tokens_total", "counter", "Estimated completion tokens received", "completion_tokens"),
+            ("sdlc_stage_cache_hits_total", "counter", "LLM calls served from the response cache", "cache_hits"),
+            ("sdlc_stage_retries_total", "counter", "LLM call retries", "retries"),
+            ("sdlc_stage_errors_total", "counter", "Failed LLM calls", "errors"),
+            ("sdlc_stage_fallbacks_total", "counter", "LLM calls sent to the fallback model", "fallbacks"),
+            ("sdlc_stage_coalesced_total", "counter", "LLM calls served by an identical call already in flight", "coalesced"),
+        ]
+        lines = []
+        for name, kind, help_text, field in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for node, totals in sorted(self.totals.items()):
+                lines.append(f'{name}{{stage="{node}",pid="{self.pid}"}} {totals[field]:g}')
+        return "\n".join(lines) + "\n"
+
+
+def combined_prometheus_text(pattern=PROM_GLOB):
+    """The Prometheus exports of every process on disk as one exposition, or "" if there are none"""
+    headers, samples = {}, defaultdict(list)
+    for path in sorted(glob.glob(pattern)):
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            # Replaced or removed while we were listing
+            continue
+        for line in text.splitlines():
+            if line.startswith("# "):
+                name = line.split()[2]
+                headers.setdefault(name, [])
+                if len(headers[name]) < 2:
+                    headers[name].append(line)
+            elif line:
+                samples[line.split("{", 1)[0].split(" ", 1)[0]].append(line)
+    return "".join("\n".join(lines + samples[name]) + "\n" for name, lines in headers.items())
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    """Process-wide metrics recorder"""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = MetricsRecorder()
+        return _recorder
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import unittest
+
+from coalesce import FlightAbandoned, SingleFlight
+
+
+async def gated(gate, error=None):
+    """Yields "a", then "b" once gate is set (or raises error)"""
+    yield "a"
+    await gate.wait()
+    if error:
+        raise error
+    yield "b"
+
+
+async def collect(stream, into):
+    async for chunk in stream:
+        into.append(chunk)
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def start_pair(self, source):
+        """Leader and follower tasks on one key, the follower joining once the leader has its first chunk"""
+        flights = SingleFlight()
+        led, followed = [], []
+        leader = asyncio.create_task(collect(flights.stream("k", source), led))
+        while not led:
+            await asyncio.sleep(0)
+        follower = asyncio.create_task(collect(flights.stream("k", source), followed))
+        await asyncio.sleep(0)
+        return flights, leader, follower, led, followed
+
+    async def test_follower_receives_the_leaders_chunks(self):
+        gate = asyncio.Event()
+        flights, leader, follower, led, followed = await self.start_pair(lambda: gated(gate))
+        gate.set()
+        await asyncio.wait_for(asyncio.gather(leader, follower), 2)
+        self.assertEqual(led, ["a", "b"])
+        self.assertEqual(followed, ["a", "b"])
+        self.assertEqual(flights.stats(), {"leaders": 1, "coalesced": 1, "in_flight": 0})
+
+    async def test_leader_error_reaches_followers(self):
+        gate = asyncio.Event()
+        flights, leader, follower, _, followed = await self.start_pair(lambda: gated(gate, ValueError("boom")))
+        gate.set()
+        results = await asyncio.wait_for(asyncio.gather(leader, follower, return_exceptions=True), 2)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(followed, ["a"])
+        self.assertEqual(flights.stats()["in_flight"], 0)
+
+    async def test_cancelled_leader_does_not_hang_followers(self):
+        flights, leader, follower, _, followed = await self.start_pair(lambda: gated(asyncio.Event()))
+        leader.cancel()
+        with self.assertRaises(FlightAbandoned):
+            await asyncio.wait_for(follower, 2)
+        self.assertEqual(followed, ["a"])
+        # The next call starts a flight of its own
+        self.assertEqual(flights.join("k")[1], True)
+
+
+class EarlyStopAcrossThreadsTest(unittest.TestCase):
+    def test_leader_stopping_early_ends_the_follower_in_another_thread(self):
+        flights = SingleFlight()
+        leader_ready, follower_joined = threading.Event(), threading.Event()
+        led, followed, errors = [], [], []
+
+        async def source():
+            yield "a"
+            # Never produced: the leader stops reading before this
+            await asyncio.sleep(3600)
+            yield "b"
+
+        async def lead():
+            stream = flights.stream("k", source)
+            led.append(await stream.__anext__())
+            leader_ready.set()
+            await asyncio.get_running_loop().run_in_executor(None, follower_joined.wait, 2)
+            await stream.aclose()
+
+        async def follow():
+            try:
+                await asyncio.wait_for(collect(flights.stream("k", source, follower_joined.set), followed), 2)
+            except Exception as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=lambda: asyncio.run(lead()))
+        leader.start()
+        self.assertTrue(leader_ready.wait(2))
+        follower = threading.Thread(target=lambda: asyncio.run(follow()))
+        follower.start()
+        leader.join(5)
+        follower.join(5)
+        self.assertFalse(leader.is_alive() or follower.is_alive())
+        self.assertEqual(led, ["a"])
+        # A deliberate early stop ends the flight for everyone, without an error
+        self.assertEqual((followed, errors), (["a"], []))
+        self.assertEqual(flights.stats(), {"leaders": 1, "coalesced": 1, "in_flight": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
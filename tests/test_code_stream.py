@@ -0,0 +1,85 @@
+import unittest
+
+from code_stream import CodeStreamParser, clean_code, open_string, starts_code
+
+
+def stream(text, chunk_chars=7):
+    """(code, error, chars read) of text fed to a parser chunk by chunk, stopping where the parser does"""
+    parser = CodeStreamParser()
+    read = len(text)
+    for at in range(0, len(text), chunk_chars):
+        if parser.feed(text[at:at + chunk_chars]):
+            read = at + chunk_chars
+            break
+    return parser.finish(), parser.error, read
+
+
+class EarlyStopTest(unittest.TestCase):
+    def test_stops_after_main_guard_block(self):
+        text = ("Here is the code:\n```python\nimport os\n\ndef main():\n    print(os.name)\n\n"
+                "if __name__ == \"__main__\":\n    main()\n```\n\n## Explanation\n" + "More prose. " * 100)
+        code, error, read = stream(text)
+        self.assertIsNone(error)
+        self.assertTrue(code.endswith("    main()\n"))
+        self.assertLess(read, len(text) // 2)
+
+    def test_small_first_block_does_not_end_the_module(self):
+        text = ("First the helper:\n```python\ndef helper():\n    return 1\n```\nThen the app:\n"
+                "```python\ndef main():\n    print(helper())\n\nif __name__ == '__main__':\n    main()\n```\nDone.")
+        code, error, _ = stream(text)
+        self.assertIsNone(error)
+        self.assertIn("def helper():", code)
+        self.assertIn("def main():", code)
+
+    def test_bare_module_ends_at_prose_after_main_guard(self):
+        text = "import os\n\ndef main():\n    print(1)\n\nif __name__ == \"__main__\":\n    main()\n\nThis program prints one.\n"
+        code, error, _ = stream(text)
+        self.assertIsNone(error)
+        self.assertNotIn("This program", code)
+
+
+class ProseTest(unittest.TestCase):
+    def test_prose_like_assignment_is_not_code(self):
+        code, error = clean_code("Note: x = 5 is used below.\n\n```python\nx = 5\nprint(x)\n```\n")
+        self.assertIsNone(error)
+        self.assertEqual(code, "x = 5\nprint(x)\n")
+
+    def test_labelled_fence_after_bare_lines_replaces_them(self):
+        code, error = clean_code("Result = the sum of parts\n```python\nx = 5\n```\n")
+        self.assertIsNone(error)
+        self.assertEqual(code, "x = 5\n")
+
+    def test_starts_code(self):
+        for line in ["x: int = 5", "data: dict = {", "items: list[str] = []", "MAX: int = 3", "import os"]:
+            self.assertTrue(starts_code(line), line)
+        for line in ["Note: x = 5 is used", "Example: y = 2 works", "This is prose."]:
+            self.assertFalse(starts_code(line), line)
+
+    def test_trailing_prose_dropped(self):
+        self.assertEqual(clean_code("def f():\n    return 1\n\nHope this helps!\n"), ("def f():\n    return 1\n", None))
+
+    def test_syntax_error_reported(self):
+        code, error = clean_code("```bash\npip install x\n```\n```python\ndef f(:\n```\nmore")
+        self.assertEqual(code, "def f(:\n")
+        self.assertIsNotNone(error)
+
+
+class StringTest(unittest.TestCase):
+    def test_fence_inside_triple_quoted_string_is_kept(self):
+        text = ("```python\nHELP = '''Usage:\n```\nfoo --bar\n```\n'''\n\ndef main():\n    print(HELP)\n\n"
+                "if __name__ == '__main__':\n    main()\n```\nExplanation follows.")
+        code, error, _ = stream(text)
+        self.assertIsNone(error)
+        self.assertIn("foo --bar", code)
+        self.assertIn("def main():", code)
+
+    def test_open_string(self):
+        self.assertEqual(open_string("s = '''abc"), "'''")
+        self.assertIsNone(open_string("s = '''abc'''"))
+        self.assertIsNone(open_string("x = \"a'''b\""))
+        self.assertIsNone(open_string("x = 1  # \"\"\""))
+        self.assertIsNone(open_string("end'''", "'''"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from llm_cache import LLMCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+class LLMCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LLMCache(":memory:", max_bytes=10, ttl_seconds=100, clock=self.clock)
+
+    def test_key_covers_model_prompt_and_params(self):
+        key = LLMCache.make_key("flash", "hi", {"temperature": 0.2})
+        self.assertEqual(key, LLMCache.make_key("flash", "hi", {"temperature": 0.2}))
+        self.assertNotEqual(key, LLMCache.make_key("pro", "hi", {"temperature": 0.2}))
+        self.assertNotEqual(key, LLMCache.make_key("flash", "hi", {"temperature": 0.3}))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.put("a", "aaaa")
+        self.cache.put("b", "bbbb")
+        # Reading a makes b the least recently used
+        self.assertEqual(self.cache.get("a"), "aaaa")
+        self.cache.put("c", "cccc")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), "aaaa")
+        self.assertEqual(self.cache.get("c"), "cccc")
+        self.assertEqual(self.cache.stats()["bytes"], 8)
+
+    def test_expired_entry_is_a_miss_and_removed(self):
+        self.cache.put("a", "aaaa")
+        self.clock.now += 100
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats(), {"hits": 0, "misses": 1, "entries": 0, "bytes": 0})
+
+    def test_entry_within_ttl_is_a_hit(self):
+        self.cache.put("a", "aaaa")
+        self.clock.now += 90
+        self.assertEqual(self.cache.get("a"), "aaaa")
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_put_drops_expired_entries(self):
+        self.cache.put("a", "aaaa")
+        self.clock.now += 200
+        self.cache.put("b", "bbbb")
+        self.assertEqual(self.cache.stats()["entries"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
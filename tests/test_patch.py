@@ -0,0 +1,47 @@
+import unittest
+
+from patch import PatchError, apply_diff, unified_diff
+
+
+class RoundTripTest(unittest.TestCase):
+    def assertRoundTrip(self, old, new):
+        self.assertEqual(apply_diff(old, unified_diff(old, new)), new)
+
+    def test_simple_change(self):
+        self.assertRoundTrip("def add(a, b):\n    return a - b\n", "def add(a, b):\n    return a + b\n")
+
+    def test_removed_line_starting_with_dashes(self):
+        old = 'def f():\n    """Usage\n\n-- options --\n    x\n    """\n    return 1\n'
+        new = 'def f():\n    """Usage\n\n    x\n    """\n    return 2\n'
+        self.assertRoundTrip(old, new)
+
+    def test_added_line_starting_with_pluses(self):
+        self.assertRoundTrip("a\n-- b\nc\n", "a\n++ b\nc\n")
+
+    def test_fence_inside_string(self):
+        old = 'HELP = """Usage:\n```\nfoo --bar\n```\n"""\n\nprint(HELP)\n'
+        self.assertRoundTrip(old, old.replace("foo --bar", "foo --baz"))
+
+
+class ApplyTest(unittest.TestCase):
+    def test_fenced_diff_with_wrong_line_numbers(self):
+        diff = "```diff\n--- a/app.py\n+++ b/app.py\n@@ -7,2 +7,2 @@\n def add(a, b):\n-    return a - b\n+    return a + b\n```"
+        self.assertEqual(apply_diff("x = 1\n\ndef add(a, b):\n    return a - b\n", diff),
+                         "x = 1\n\ndef add(a, b):\n    return a + b\n")
+
+    def test_fenced_diff_with_fence_inside_string(self):
+        old = 'HELP = """Usage:\n```\nfoo --bar\n```\n"""\n'
+        new = old.replace("foo --bar", "foo --baz")
+        self.assertEqual(apply_diff(old, f"```diff\n{unified_diff(old, new)}```\n"), new)
+
+    def test_no_hunks(self):
+        with self.assertRaises(PatchError):
+            apply_diff("x = 1\n", "NO CHANGES")
+
+    def test_mismatched_hunk(self):
+        with self.assertRaises(PatchError):
+            apply_diff("x = 1\n", "@@ -1 +1 @@\n-y = 1\n+y = 2\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import asyncio
+import unittest
+
+from rate_limit import TokenBucket, is_retryable, retry_with_backoff
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(60, clock=self.clock)
+
+    def test_refills_at_the_rate_up_to_capacity(self):
+        self.bucket.level = 0
+        self.clock.now += 10
+        self.bucket.refill()
+        self.assertAlmostEqual(self.bucket.level, 10)
+        self.clock.now += 3600
+        self.bucket.refill()
+        self.assertEqual(self.bucket.level, 60)
+
+    def test_wait_time_covers_debt(self):
+        self.bucket.level = -5
+        self.assertAlmostEqual(self.bucket.wait_time(1), 6)
+        self.bucket.level = 3
+        self.assertEqual(self.bucket.wait_time(1), 0)
+        # More than the bucket holds only waits for a full bucket
+        self.assertAlmostEqual(self.bucket.wait_time(1000), 57)
+
+
+class RetryableTest(unittest.TestCase):
+    def test_transient_errors_are_retryable(self):
+        for error in (TimeoutError(), ConnectionError(), asyncio.TimeoutError(), ResourceExhausted("quota"),
+                      StatusError(429), StatusError(503), Exception("429 Too Many Requests"), Exception("Rate limit hit")):
+            self.assertTrue(is_retryable(error), error)
+
+    def test_other_errors_are_not(self):
+        for error in (ValueError("bad prompt"), StatusError(400), StatusError(403), KeyError("x")):
+            self.assertFalse(is_retryable(error), error)
+
+
+class RetryWithBackoffTest(unittest.TestCase):
+    def run_retries(self, errors, **kwargs):
+        calls, delays = [], []
+
+        async def call():
+            calls.append(1)
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return "ok"
+
+        result = asyncio.run(retry_with_backoff(call, on_retry=lambda attempt, delay, e: delays.append(delay), **kwargs))
+        return result, len(calls), delays
+
+    def test_retries_until_success_within_backoff_bounds(self):
+        result, calls, delays = self.run_retries([StatusError(429)] * 3, base_delay=0.001, max_delay=0.003)
+        self.assertEqual((result, calls), ("ok", 4))
+        for attempt, delay in enumerate(delays):
+            self.assertLessEqual(delay, min(0.003, 0.001 * 2 ** attempt))
+            self.assertGreaterEqual(delay, 0)
+
+    def test_non_retryable_error_is_raised_at_once(self):
+        with self.assertRaises(ValueError):
+            self.run_retries([ValueError("bad prompt")], base_delay=0.001)
+
+    def test_gives_up_after_max_retries(self):
+        calls = []
+
+        async def call():
+            calls.append(1)
+            raise StatusError(503)
+
+        with self.assertRaises(StatusError):
+            asyncio.run(retry_with_backoff(call, max_retries=2, base_delay=0.001))
+        self.assertEqual(len(calls), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
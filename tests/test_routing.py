@@ -0,0 +1,82 @@
+import unittest
+
+from routing import ModelRouter, backend_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBackend:
+    def __init__(self, route):
+        self.model = route["model"]
+
+
+def make_router(clock, routes=None, default="flash", fallback="flash-8b"):
+    return ModelRouter({"backend": "fake", "model": default}, {"backend": "fake", "model": fallback}, FakeBackend,
+                       routes={"Dev": {"model": "pro"}} if routes is None else routes,
+                       p95_seconds=5, error_rate=0.5, min_calls=4, cooldown_seconds=60, clock=clock)
+
+
+class RouterTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.router = make_router(self.clock)
+        self.primary = self.router.route("Dev")
+
+    def observe(self, seconds, ok, calls=4):
+        for _ in range(calls):
+            self.router.observe(self.primary, seconds, ok)
+
+    def test_healthy_primary(self):
+        self.observe(1.0, True)
+        backend, route, is_fallback = self.router.select("Dev")
+        self.assertEqual((backend.model, route["model"], is_fallback), ("pro", "pro", False))
+
+    def test_slow_primary_trips_to_fallback(self):
+        self.observe(10.0, True)
+        backend, route, is_fallback = self.router.select("Dev")
+        self.assertEqual((backend.model, is_fallback), ("flash-8b", True))
+        self.assertTrue(self.router.status()[backend_key(self.primary)]["bypassed"])
+
+    def test_too_few_calls_do_not_trip(self):
+        self.observe(10.0, True, calls=3)
+        self.assertFalse(self.router.select("Dev")[2])
+
+    def test_errors_trip_to_fallback(self):
+        self.observe(1.0, True, calls=1)
+        self.observe(1.0, False, calls=3)
+        self.assertEqual(self.router.select("Dev")[1]["model"], "flash-8b")
+
+    def test_cooldown_returns_to_primary_with_a_fresh_window(self):
+        self.observe(10.0, True)
+        self.assertTrue(self.router.select("Dev")[2])
+        self.clock.now += 59
+        self.assertTrue(self.router.select("Dev")[2])
+        self.clock.now += 2
+        self.assertFalse(self.router.select("Dev")[2])
+        self.assertEqual(self.router.tracker.stats(backend_key(self.primary))["calls"], 0)
+
+    def test_node_on_the_fallback_model_falls_back_to_the_default(self):
+        router = make_router(self.clock, routes={"Review": {"model": "flash-8b"}})
+        route = router.route("Review")
+        for _ in range(4):
+            router.observe(route, 10.0, True)
+        backend, fallback, is_fallback = router.select("Review")
+        self.assertEqual((backend.model, fallback["model"], is_fallback), ("flash", "flash", True))
+        self.assertEqual(router.without_fallback(["Review"]), [])
+
+    def test_no_fallback_when_every_model_is_the_same(self):
+        router = make_router(self.clock, routes={}, default="flash", fallback="flash")
+        for _ in range(4):
+            router.observe(router.route("Dev"), 10.0, False)
+        self.assertEqual(router.without_fallback(["Dev"]), ["Dev"])
+        self.assertEqual(router.select("Dev")[1:], ({"backend": "fake", "model": "flash"}, False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+
+from speculation import Speculation
+from telemetry import new_stage_record
+
+TRIGGERS = {"Dev": {"input": "design", "sections": ["function"], "prefix_chars": None}}
+OUTPUTS = {"Design": "design", "Dev": "code"}
+DESIGN = "## Functions\n- add(a, b)\n\n## Data Structures\n- list of tasks\n"
+
+
+class RecordingHooks:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append(name)
+
+
+class SpeculationTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.seen = []
+
+        async def dev(state, config):
+            self.seen.append(state["design"])
+            config["configurable"]["hooks"].stage_completed("Development Agent", "code", "def add(a, b): ...")
+            return {"code": "def add(a, b): ..."}
+
+        self.speculation = Speculation(TRIGGERS, {"Dev": dev}, OUTPUTS, dict)
+        self.hooks = RecordingHooks()
+
+    async def start_dev(self):
+        """Stream the design until its Functions section is finished, which starts Dev"""
+        self.speculation.on_partial({}, "design", "## Functions\n- add(a, b)\n")
+        self.assertNotIn("Dev", self.speculation.runs)
+        self.speculation.on_partial({}, "design", "## Functions\n- add(a, b)\n\n## Data")
+        self.assertIn("Dev", self.speculation.runs)
+        await asyncio.sleep(0)
+
+    async def claim(self, design):
+        return await self.speculation.claim("Dev", {"design": design}, self.hooks, "Development Agent",
+                                            new_stage_record("run", "Dev"))
+
+    async def test_accepted_when_the_finished_sections_are_unchanged(self):
+        await self.start_dev()
+        self.assertEqual(await self.claim(DESIGN), {"code": "def add(a, b): ..."})
+        self.assertEqual(self.seen, ["## Functions\n- add(a, b)\n\n"])
+        # Hook calls held back during the speculative run are replayed once it is used
+        self.assertEqual(self.hooks.calls, ["stage_completed", "communicate"])
+        report = self.speculation.close()
+        self.assertEqual((report["accepted"], report["restarted"]), (["Dev"], []))
+
+    async def test_restarted_when_a_finished_section_changed(self):
+        await self.start_dev()
+        task = self.speculation.runs["Dev"]["task"]
+        self.assertIsNone(await self.claim(DESIGN.replace("add(a, b)", "add(a, b, c)")))
+        self.assertTrue(task.cancelled() or task.done())
+        self.assertNotIn("stage_completed", self.hooks.calls)
+        report = self.speculation.close()
+        self.assertEqual((report["accepted"], report["restarted"]), ([], ["Dev"]))
+
+    async def test_unclaimed_run_is_cancelled_on_close(self):
+        async def slow_dev(state, config):
+            await asyncio.sleep(3600)
+
+        self.speculation.agents["Dev"] = slow_dev
+        await self.start_dev()
+        task = self.speculation.runs["Dev"]["task"]
+        report = self.speculation.close()
+        await asyncio.sleep(0)
+        self.assertTrue(task.cancelled())
+        self.assertEqual(self.speculation.runs, {})
+        self.assertEqual((report["accepted"], report["restarted"]), ([], []))
+        self.assertGreaterEqual(report["wasted_seconds"], 0)
+
+    async def test_a_node_without_a_speculative_run_runs_normally(self):
+        self.assertIsNone(await self.claim(DESIGN))
+
+
+if __name__ == "__main__":
+    unittest.main()
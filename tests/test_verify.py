@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+
+from verify import SandboxError, extract_code, run_tests, sandbox_command
+
+HELP_MODULE = 'HELP = """Usage:\n```\nfoo --bar\n```\n"""\n\nprint(HELP)\n'
+
+
+class ExtractCodeTest(unittest.TestCase):
+    def test_fenced_answer(self):
+        self.assertEqual(extract_code("Here it is:\n```python\nx = 1\n```\nDone."), "x = 1\n")
+
+    def test_blocks_are_joined(self):
+        self.assertEqual(extract_code("```python\nx = 1\n```\nand\n```\ny = 2\n```"), "x = 1\n\n\ny = 2\n")
+
+    def test_plain_code_with_fence_in_string(self):
+        self.assertEqual(extract_code(HELP_MODULE), HELP_MODULE)
+
+    def test_fenced_answer_with_indented_fence_in_string(self):
+        code = 'def usage():\n    return """\n    ```\n    foo --bar\n    ```\n    """\n'
+        self.assertEqual(extract_code(f"```python\n{code}```\nThat's all."), code)
+
+
+class RunTestsTest(unittest.TestCase):
+    def test_inherited_tests_are_run(self):
+        tests = ("import unittest\nfrom app import add\n\n"
+                 "class Base(unittest.TestCase):\n    def test_add(self):\n        self.assertEqual(add(1, 2), 3)\n\n"
+                 "class Sub(Base):\n    def test_zero(self):\n        self.assertEqual(add(0, 0), 0)\n")
+        results = asyncio.run(run_tests("def add(a, b):\n    return a + b\n", tests, sandbox="none"))
+        self.assertEqual(sorted(r["id"] for r in results),
+                         ["test_app.Base.test_add", "test_app.Sub.test_add", "test_app.Sub.test_zero"])
+        self.assertTrue(all(r["status"] == "passed" for r in results))
+
+
+class SandboxTest(unittest.TestCase):
+    def test_unknown_sandbox_runs_nothing(self):
+        with self.assertRaises(SandboxError):
+            asyncio.run(run_tests("x = 1\n", "open('ran', 'w')\n", sandbox="chroot"))
+
+    def test_bwrap_command_isolates_the_test(self):
+        command = sandbox_command(["python", "-c", "pass"], "/tmp/ws", "/usr/bin/bwrap")
+        self.assertEqual(command[:2], ["/usr/bin/bwrap", "--unshare-all"])
+        self.assertEqual(command[-3:], ["python", "-c", "pass"])
+        self.assertIn(["--ro-bind", "/tmp/ws", "/tmp/ws"], [command[i:i + 3] for i in range(len(command))])
+        self.assertNotIn("--bind", command)
+
+    def test_no_sandbox_leaves_the_command_alone(self):
+        self.assertEqual(sandbox_command(["python"], "/tmp/ws", None), ["python"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import asyncio
+import tempfile
+import unittest
+
+import artifacts
+import telemetry
+from workflow import input_fingerprint, instrumented, load_artifacts, loop_nodes, node_dependencies, stale_nodes
+
+DOWNSTREAM = ["Review", "Testing", "Verify", "Deploy"]
+
+
+class StaleNodesTest(unittest.TestCase):
+    def test_stale_nodes_per_edited_key(self):
+        expected = {
+            "requirements": {"Design", "Dev", *DOWNSTREAM},
+            "design": {"Dev", *DOWNSTREAM},
+            "code": set(DOWNSTREAM),
+            # Verify only waits for the review, it doesn't read it
+            "review": {"Deploy"},
+            "tests": {"Verify", "Deploy"},
+            "verification": {"Deploy"},
+            "deploy": set(),
+        }
+        for key, nodes in expected.items():
+            self.assertEqual(stale_nodes([key]), nodes, key)
+
+    def test_loop_nodes_per_edited_key(self):
+        # Fix reads the code and the review; anything upstream of either may start another round
+        for key in ["requirements", "design", "code", "review"]:
+            self.assertEqual(loop_nodes([key]), {"Fix"}, key)
+        for key in ["tests", "verification", "deploy"]:
+            self.assertEqual(loop_nodes([key]), set(), key)
+
+    def test_verify_still_waits_for_the_review(self):
+        self.assertEqual(node_dependencies()["Verify"], ["Review", "Testing"])
+
+    def test_fingerprint_covers_only_the_inputs(self):
+        state = {"code": "x = 1", "tests": "t", "review": "ok"}
+        fingerprint = input_fingerprint("Verify", state)
+        self.assertEqual(input_fingerprint("Verify", {**state, "review": "edited"}), fingerprint)
+        self.assertNotEqual(input_fingerprint("Verify", {**state, "tests": "edited"}), fingerprint)
+
+
+class InstrumentedTest(unittest.TestCase):
+    def setUp(self):
+        # Real store and recorder, kept out of the working directory
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = artifacts._store, telemetry._recorder
+        artifacts._store = artifacts.ArtifactStore(self.tmp.name)
+        telemetry._recorder = telemetry.MetricsRecorder(jsonl_path=None, prom_path=None)
+
+    def tearDown(self):
+        artifacts._store, telemetry._recorder = self.saved
+        self.tmp.cleanup()
+
+    def test_fix_keeps_testing_current_but_not_verify(self):
+        async def fix(state, config):
+            return {"code": state["code"] + "\n# fixed", "review_rounds": 1}
+
+        state = {"code": "x = 1", "tests": "t", "review": "CHANGES REQUESTED"}
+        state["fingerprints"] = {node: input_fingerprint(node, state) for node in ["Testing", "Verify"]}
+        update = asyncio.run(instrumented("Fix", fix)(state, {}))
+        fixed = {**state, **update}
+        # Testing ran beside the loop on the pre-fix code; the fix doesn't make its tests stale
+        self.assertEqual(update["fingerprints"]["Testing"], input_fingerprint("Testing", fixed))
+        self.assertNotIn("Verify", update["fingerprints"])
+        self.assertNotEqual(state["fingerprints"]["Verify"], input_fingerprint("Verify", fixed))
+        self.assertEqual(load_artifacts(fixed)["code"], "x = 1\n# fixed")
+
+    def test_hand_edit_flag_clears_only_when_the_node_regenerates(self):
+        async def testing(state, config):
+            return {"tests": "regenerated"}
+
+        async def fix(state, config):
+            return {"code": state["code"] + "\n# fixed"}
+
+        state = {"code": "x = 1", "tests": "t", "review": "r", "hand_edited": {"code": True, "tests": True}}
+        self.assertEqual(asyncio.run(instrumented("Testing", testing)(state, {}))["hand_edited"], {"tests": False})
+        # A fix round patches the edited code, which stays flagged
+        self.assertNotIn("hand_edited", asyncio.run(instrumented("Fix", fix)(state, {})))
+
+
+if __name__ == "__main__":
+    unittest.main()
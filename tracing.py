@@ -0,0 +1,185 @@
+"""Durable run traces, and replay of them without a model.
+
+Every run appends events to TRACE_DIR/<run_id>.jsonl.gz: the agents' messages
+and handovers, each LLM call (hash of the prompt, output, timings) and each
+stage's metrics. The file is flushed after every event, so a crashed run
+keeps its trace up to the last event.
+
+A trace can be replayed through the same graph and UI by the "replay" LLM
+backend (llm_backend=replay, replay_trace=<file>, replay_speed=<factor>), or
+headless for load tests:
+
+    python tracing.py show traces/<run_id>.jsonl.gz
+    python tracing.py replay traces/<run_id>.jsonl.gz --speed 10 --runs 8
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+
+from dotenv import load_dotenv
+
+# The command line imports workflow, which loads .env for the rest, only after this is read
+load_dotenv()
+TRACE_DIR = os.getenv("trace_dir", "traces")
+
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def trace_path(run_id, root=TRACE_DIR):
+    return os.path.join(root, re.sub(r"[^\w.-]", "_", str(run_id)) + ".jsonl.gz")
+
+
+class TraceWriter:
+    """Appends the events of one run to its compressed JSONL trace"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.started = time.time()
+        # Append mode adds a gzip member per session, so a resumed run extends its trace
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, event, **fields):
+        line = json.dumps({"t": round(time.time() - self.started, 4), "event": event, **fields})
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line + "\n")
+            # A sync flush makes everything so far decodable even if the process dies
+            self._file.flush()
+
+    def llm_call(self, node, prompt, model, output, ttft=0.0, seconds=0.0, chunks=1, cached=False):
+        self.write("llm", node=node, prompt_sha256=prompt_hash(prompt), model=model, output=output,
+                   ttft=round(ttft, 4), seconds=round(seconds, 4), chunks=chunks, cached=cached)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class TracingHooks:
+    """Hooks that also write the run's messages and handovers to its trace"""
+
+    def __init__(self, inner, trace):
+        self.inner = inner
+        self.trace = trace
+
+    def communicate(self, agent_name, message, recipient=None, is_handover=False):
+        self.trace.write("message", agent=agent_name, message=message, recipient=recipient, is_handover=is_handover)
+        self.inner.communicate(agent_name, message, recipient, is_handover)
+
+    def error(self, message):
+        self.trace.write("error", message=message)
+        self.inner.error(message)
+
+    def speculation_finished(self, report):
+        self.trace.write("speculation", **report)
+        self.inner.speculation_finished(report)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+async def timed(stream, timing):
+    """Pass a chunk stream through, noting time to first chunk, duration and chunk count in timing"""
+    start = time.time()
+    timing.update(ttft=0.0, seconds=0.0, chunks=0)
+    try:
+        async for chunk in stream:
+            if not timing["chunks"]:
+                timing["ttft"] = time.time() - start
+            timing["chunks"] += 1
+            yield chunk
+    finally:
+        timing["seconds"] = time.time() - start
+        # Stopping early must reach the model's stream, not wait for garbage collection
+        await stream.aclose()
+
+
+def read_trace(path):
+    """Events of a trace in order; a member cut short by a crash ends the trace there"""
+    events = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    break
+    except (EOFError, zlib.error, gzip.BadGzipFile):
+        pass
+    return events
+
+
+def summarize_trace(events):
+    """Per-node LLM calls, output size and seconds, and message counts of a trace"""
+    nodes = {}
+    for event in events:
+        if event["event"] == "llm":
+            node = nodes.setdefault(event["node"], {"calls": 0, "chars": 0, "seconds": 0.0, "cached": 0})
+            node["calls"] += 1
+            node["chars"] += len(event["output"])
+            node["seconds"] += event["seconds"]
+            node["cached"] += int(event["cached"])
+    messages = [e for e in events if e["event"] == "message"]
+    return {
+        "events": len(events),
+        # Each session of a resumed run restarts the clock
+        "duration_seconds": sum(e["t"] for e in events if e["event"] == "end") or (events[-1]["t"] if events else 0.0),
+        "messages": len(messages),
+        "handovers": sum(1 for e in messages if e["is_handover"]),
+        "nodes": nodes,
+    }
+
+
+async def replay(path, speed, runs):
+    """Run the workflow `runs` times at once against the trace; returns each run's seconds"""
+    import workflow
+
+    workflow.LLM_BACKEND = "replay"
+    workflow.LLM_READY = True
+    workflow.REPLAY_TRACE = path
+    workflow.REPLAY_SPEED = speed
+    spec = next((e["spec"] for e in read_trace(path) if e["event"] == "run" and e.get("spec")), workflow.DEFAULT_SPEC)
+
+    async def one(i):
+        start = time.perf_counter()
+        config = {"configurable": {"thread_id": f"replay-{i}-{time.time_ns()}", "bypass_cache": True}}
+        await workflow.run_workflow(workflow.initial_state(spec), config)
+        return time.perf_counter() - start
+
+    return await asyncio.gather(*(one(i) for i in range(runs)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or replay recorded workflow runs")
+    parser.add_argument("command", choices=["show", "replay"])
+    parser.add_argument("trace", help="trace file, e.g. traces/<run_id>.jsonl.gz")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up (0 replays without delays)")
+    parser.add_argument("--runs", type=int, default=1, help="concurrent replays, for load testing")
+    settings = parser.parse_args()
+    events = read_trace(settings.trace)
+    if not events:
+        parser.error(f"no events in {settings.trace}")
+    if settings.command == "show":
+        print(json.dumps(summarize_trace(events), indent=2))
+        return
+    times = asyncio.run(replay(settings.trace, settings.speed, settings.runs))
+    recorded = summarize_trace(events)["duration_seconds"]
+    print(f"{settings.runs} replays at {settings.speed:g}x: "
+          f"{min(times):.2f}-{max(times):.2f}s each (recorded run: {recorded:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
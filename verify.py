@@ -0,0 +1,225 @@
+"""Run the generated unit tests against the generated code.
+
+The code and tests are written to a temporary workspace, unittest's loader
+lists the test cases in a limited child process, and every test case then
+runs in its own subprocess, a few at a time, with a timeout and CPU, memory,
+process and file-size limits, so one runaway test only costs its own slot.
+Each test runs in its own process group, which is killed once the test ends
+or times out.
+
+The code is untrusted, so every process runs inside bubblewrap: no network,
+no other namespaces, a read-only view of the interpreter and system
+libraries only, the workspace read-only and a scratch tmpfs for /tmp. Running
+without it (sandbox="none") is only meant for trusted code on a dev machine.
+"""
+
+import ast
+import asyncio
+import os
+import re
+import shutil
+import signal
+import sys
+import tempfile
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, timeouts still apply
+    resource = None
+
+# Fences start at column 0, so a fenced example inside a string literal is left alone
+FENCE = re.compile(r"^```(?:python|py)?[ \t]*\n(.*?)^```[ \t]*$", re.DOTALL | re.MULTILINE)
+# Last line of a traceback, e.g. "AssertionError: 1 != 2"
+EXCEPTION_LINE = re.compile(r"^\w+(?:\.\w+)*(?:Error|Exception|Exit|Interrupt)\b.*$", re.MULTILINE)
+MAX_CAPTURE = 64 * 1024
+# Processes the server user may run and bytes a test may write per file, while a test runs
+MAX_PROCESSES = 256
+MAX_FILE_BYTES = 64 * 1024 * 1024
+# Isolation layers the tests can run in; "none" runs them as the server user
+SANDBOXES = ("bwrap", "none")
+
+
+class SandboxError(Exception):
+    """The tests cannot run because their isolation layer is not available"""
+
+
+def extract_code(text):
+    """Python source from an LLM answer, without markdown fences"""
+    try:
+        # Already plain code (clean_code's output): a fence line in it belongs to a string
+        ast.parse(text)
+        return text
+    except SyntaxError:
+        pass
+    blocks = FENCE.findall(text)
+    return "\n\n".join(blocks) if blocks else text
+
+
+# Applies the limits inside the child, then runs a script whose last argument is a test name
+# (a preexec_fn would run between fork and exec, which is unsafe with other threads running)
+LIMITS = (
+    "import resource, sys\n"
+    "cpu, memory, processes, file_bytes = map(int, sys.argv[1:5])\n"
+    "resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))\n"
+    "resource.setrlimit(resource.RLIMIT_AS, (memory, memory))\n"
+    "resource.setrlimit(resource.RLIMIT_NPROC, (processes, processes))\n"
+    "resource.setrlimit(resource.RLIMIT_FSIZE, (file_bytes, file_bytes))\n"
+)
+# Runs one test case as `python -m unittest <id>` would
+RUN_TEST = "import sys, unittest\nunittest.main(module=None, argv=['python -m unittest', sys.argv[-1]])\n"
+# Lists every test case unittest would run, including ones a class inherits
+LIST_TESTS = (
+    "import sys, unittest\n"
+    "def ids(suite):\n"
+    "    for test in suite:\n"
+    "        yield from ids(test) if isinstance(test, unittest.TestSuite) else [test.id()]\n"
+    "for test_id in ids(unittest.defaultTestLoader.loadTestsFromName(sys.argv[-1])):\n"
+    "    print('TEST_ID', test_id)\n"
+)
+TEST_ID_LINE = re.compile(r"^TEST_ID (\S+)$", re.MULTILINE)
+
+
+def limited_command(script, test_id, cpu_seconds, memory_bytes):
+    """Command line running script for test_id, with CPU, memory, process and file-size limits where the OS has them"""
+    if resource and os.name == "posix":
+        limits = [cpu_seconds, memory_bytes, MAX_PROCESSES, MAX_FILE_BYTES]
+        return [sys.executable, "-s", "-c", LIMITS + script, *map(str, limits), test_id]
+    return [sys.executable, "-s", "-c", script, test_id]
+
+
+def find_sandbox(sandbox):
+    """Path of the sandbox executable, None for sandbox="none"; raises SandboxError if it is not available"""
+    if sandbox not in SANDBOXES:
+        raise SandboxError(f"unknown sandbox {sandbox!r}, expected one of {', '.join(SANDBOXES)}")
+    if sandbox == "none":
+        return None
+    path = shutil.which(sandbox)
+    if not path:
+        raise SandboxError(f"{sandbox} is not installed")
+    return path
+
+
+def sandbox_command(command, workspace, bwrap):
+    """command wrapped in bubblewrap: no network, read-only system and workspace, scratch /tmp"""
+    if not bwrap:
+        return command
+    binds = []
+    # Only what the interpreter needs; the rest of the host filesystem is not visible
+    for path in dict.fromkeys(["/usr", "/bin", "/lib", "/lib64", sys.base_prefix, sys.prefix]):
+        binds += ["--ro-bind-try", path, path]
+    return [
+        bwrap, "--unshare-all", "--die-with-parent", "--new-session", *binds,
+        "--proc", "/proc", "--dev", "/dev", "--tmpfs", "/tmp",
+        "--ro-bind", workspace, workspace, "--chdir", workspace, *command,
+    ]
+
+
+def kill_tree(proc):
+    """Kill a test process and every process it started"""
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        # Already gone
+        pass
+
+
+async def run_limited(script, test_id, workspace, timeout, memory_bytes, bwrap):
+    """Run script for test_id in a fresh interpreter; returns (exit code, or None on timeout, and the output's tail)"""
+    # Only what Python needs: no API keys or other secrets from our environment
+    env = {"PATH": os.environ.get("PATH", ""), "HOME": "/tmp" if bwrap else workspace, "PYTHONDONTWRITEBYTECODE": "1"}
+    # Output goes to a file: children holding a pipe open would keep a finished test waiting for EOF
+    with tempfile.TemporaryFile() as log:
+        # A session of its own makes the test and everything it spawns one process group
+        proc = await asyncio.create_subprocess_exec(
+            *sandbox_command(limited_command(script, test_id, int(timeout) + 1, memory_bytes), workspace, bwrap),
+            cwd=workspace, env=env, start_new_session=os.name == "posix",
+            stdin=asyncio.subprocess.DEVNULL, stdout=log, stderr=asyncio.subprocess.STDOUT,
+        )
+        try:
+            await asyncio.wait_for(proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            kill_tree(proc)
+            await proc.wait()
+            return None, ""
+        finally:
+            # Children the test left behind must not outlive its workspace either
+            kill_tree(proc)
+        log.seek(max(0, log.seek(0, os.SEEK_END) - MAX_CAPTURE))
+        output = log.read()
+    return proc.returncode, output[-MAX_CAPTURE:].decode("utf-8", "replace")
+
+
+async def discover_tests(workspace, timeout, memory_bytes, bwrap, module="test_app"):
+    """Ids of the test cases unittest finds in module, empty if it cannot be loaded"""
+    returncode, text = await run_limited(LIST_TESTS, module, workspace, timeout, memory_bytes, bwrap)
+    if returncode != 0:
+        return []
+    # A module that fails to import shows up as a single unittest.loader._FailedTest
+    return [test_id for test_id in TEST_ID_LINE.findall(text) if test_id.startswith(f"{module}.")]
+
+
+async def run_test(test_id, workspace, timeout, memory_bytes, bwrap):
+    """Run one test case in a fresh interpreter; returns {"id", "status", "detail", "seconds"}"""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    returncode, text = await run_limited(RUN_TEST, test_id, workspace, timeout, memory_bytes, bwrap)
+    if returncode is None:
+        return {"id": test_id, "status": "timeout", "detail": f"no result after {timeout:g}s",
+                "seconds": loop.time() - start}
+    if returncode == 0:
+        status = "skipped" if "skipped=" in text else "passed"
+    elif returncode < 0:
+        status = "error"
+    else:
+        status = "error" if "errors=" in text else "failed"
+    errors = EXCEPTION_LINE.findall(text)
+    detail = errors[-1] if errors and status != "passed" else ""
+    if returncode < 0:
+        detail = f"killed by signal {-returncode} (resource limit?)"
+    return {"id": test_id, "status": status, "detail": detail[:200], "seconds": loop.time() - start}
+
+
+async def run_tests(code, tests, workers=4, timeout=10.0, memory_bytes=512 * 1024 * 1024, on_result=None,
+                    sandbox="bwrap"):
+    """Write code as app.py and tests as test_app.py, run each test case in parallel; returns results (SandboxError if it can't)"""
+    bwrap = find_sandbox(sandbox)
+    code, tests = extract_code(code), extract_code(tests)
+    try:
+        ast.parse(tests)
+    except SyntaxError as e:
+        return [{"id": "test_app", "status": "error", "detail": f"tests do not parse: {e}", "seconds": 0.0}]
+    with tempfile.TemporaryDirectory(prefix="sdlc-verify-") as workspace:
+        with open(os.path.join(workspace, "app.py"), "w", encoding="utf-8") as f:
+            f.write(code)
+        with open(os.path.join(workspace, "test_app.py"), "w", encoding="utf-8") as f:
+            f.write(tests)
+        # A suite that finds no test cases, or fails to import, still runs as one shard and reports why
+        test_ids = await discover_tests(workspace, timeout, memory_bytes, bwrap) or ["test_app"]
+        slots = asyncio.Semaphore(max(1, workers))
+
+        async def shard(test_id):
+            async with slots:
+                result = await run_test(test_id, workspace, timeout, memory_bytes, bwrap)
+            if on_result:
+                on_result(result)
+            return result
+
+        return await asyncio.gather(*(shard(test_id) for test_id in test_ids))
+
+
+def summarize(results, max_failures=10):
+    """Compact pass/fail report for the UI and the Deploy prompt"""
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    lines = [f"Verification: {counts.get('passed', 0)}/{len(results)} tests passed"
+             + "".join(f", {n} {status}" for status, n in sorted(counts.items()) if status != "passed")]
+    problems = [r for r in results if r["status"] not in ("passed", "skipped")]
+    for result in problems[:max_failures]:
+        lines.append(f"- {result['status'].upper()} {result['id']}: {result['detail']}")
+    if len(problems) > max_failures:
+        lines.append(f"- ... {len(problems) - max_failures} more")
+    return "\n".join(lines)
@@ -0,0 +1,1048 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections.abc import Mapping
+from contextlib import nullcontext
+from typing import Annotated, TypedDict
+
+from dotenv import load_dotenv
+
+# Load .env before the local imports: routing, tracing and artifacts read their settings at import
+load_dotenv()
+
+# langgraph's graph and SQLite saver modules are imported on first use: they dominate cold start
+from langgraph.constants import START, END
+
+from artifacts import get_artifact_store
+
+from llm_cache import LLMCache
+from coalesce import SingleFlight
+from llm import get_backend, estimate_tokens
+from context_budget import STAGE_BUDGETS, SECTION_PRIORITIES, compact, fit_to_budget, outline_code
+from rate_limit import RateLimiter, retry_with_backoff
+from routing import ModelRouter
+from speculation import Speculation
+from patch import PatchError, apply_diff, unified_diff
+from verify import SandboxError, extract_code, run_tests, summarize
+from code_stream import CodeStreamParser, clean_code
+from tracing import TRACE_DIR, TraceWriter, TracingHooks, timed, trace_path
+from telemetry import get_recorder, new_stage_record, record_startup, stage_metrics, track_stage
+
+logger = logging.getLogger("workflow")
+
+API_KEY = os.getenv("api_key")
+
+# Stage checkpoints are kept in a local SQLite file, one thread per run id
+CHECKPOINT_DB = "checkpoints.sqlite"
+
+# LLM settings and the on-disk response cache shared by all agents
+# Model used by nodes without their own model in routing.STAGE_ROUTES
+MODEL_NAME = "gemini-1.5-flash"
+# Model any node uses while its routed model is unhealthy; nodes already on it fall back to MODEL_NAME
+FALLBACK_MODEL = os.getenv("fallback_model", "gemini-1.5-flash-8b")
+# "gemini" for the real model, "fake" for the deterministic offline stand-in
+LLM_BACKEND = os.getenv("llm_backend", "gemini")
+FAKE_LATENCY = float(os.getenv("fake_latency", "0.5"))
+FAKE_RESPONSE_CHARS = int(os.getenv("fake_response_chars", "2000"))
+# "replay" answers from a recorded trace instead of a model, at replay_speed times the recorded pace
+REPLAY_TRACE = os.getenv("replay_trace", "")
+REPLAY_SPEED = float(os.getenv("replay_speed", "1"))
+LLM_READY = bool(API_KEY) or LLM_BACKEND != "gemini"
+LLM_CACHE_DB = "llm_cache.sqlite"
+LLM_CACHE_MAX_BYTES = 50 * 1024 * 1024
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# Process-wide LLM quota shared by every session and batch worker
+RPM_LIMIT = int(os.getenv("rpm_limit", "15"))
+TPM_LIMIT = int(os.getenv("tpm_limit", "1000000"))
+LLM_MAX_RETRIES = int(os.getenv("llm_max_retries", "4"))
+
+# Every run (except replays) appends its messages, LLM calls and stage metrics to TRACE_DIR/<run_id>.jsonl.gz
+RECORD_TRACES = os.getenv("record_traces", "true").lower() in ("1", "true", "yes")
+
+# Upper bound on graph nodes running at the same time
+MAX_CONCURRENCY = int(os.getenv("max_concurrency", "4"))
+
+# Opt-in speculative pipelining: a node starts once its trigger in the upstream stream is met
+# (a finished section matching one of "sections", or "prefix_chars" characters)
+SPECULATE = os.getenv("speculate", "false").lower() in ("1", "true", "yes")
+SPECULATION_TRIGGERS = {
+    "Design": {"input": "requirements", "sections": ["functional"], "prefix_chars": None},
+    "Dev": {"input": "design", "sections": ["function", "data structure"], "prefix_chars": None},
+}
+
+# Fix rounds the reviewer may request before the code goes on as is (0 disables the loop)
+MAX_REVIEW_ROUNDS = int(os.getenv("review_rounds", "2"))
+VERDICT = re.compile(r"VERDICT:\s*(APPROVED|CHANGES REQUESTED)", re.IGNORECASE)
+NO_CHANGES = re.compile(r"\bNO CHANGES\b", re.IGNORECASE)
+
+# Generated code and tests only run when verify_tests=true, and then inside verify_sandbox ("none" runs them unisolated)
+VERIFY_TESTS = os.getenv("verify_tests", "false").lower() in ("1", "true", "yes")
+VERIFY_SANDBOX = os.getenv("verify_sandbox", "bwrap")
+# Code or tests edited in the UI are arbitrary user input: they only run when verify_edits=true as well
+VERIFY_EDITS = os.getenv("verify_edits", "false").lower() in ("1", "true", "yes")
+# Deliverables Verify executes
+EXECUTED_KEYS = ("code", "tests")
+# Generated tests run this many at a time, each with its own timeout
+VERIFY_WORKERS = int(os.getenv("verify_workers", "4"))
+TEST_TIMEOUT_SECONDS = float(os.getenv("test_timeout", "10"))
+
+# Project the Requirements Agent starts from unless a run supplies its own spec
+DEFAULT_SPEC = """a CLI-based To-Do List application that should include:
+        - Add new tasks with descriptions
+        - List all tasks with their current status  
+        - Delete tasks by ID or description
+        - Mark tasks as complete/incomplete
+        - Edit existing task descriptions"""
+
+class StageError(Exception):
+    """An agent could not produce its deliverable; the run stops at this stage"""
+
+    def __init__(self, node, message):
+        super().__init__(f"{node}: {message}")
+        self.node = node
+
+def merge_entries(old, new):
+    """Reducer letting parallel nodes each record their own entries (input fingerprints, edit flags)"""
+    return {**(old or {}), **(new or {})}
+
+# Shared State Type
+class BuildState(TypedDict):
+    spec: str
+    requirements: str
+    design: str
+    code: str
+    review: str
+    tests: str
+    verification: str
+    deploy: str
+    # Review/fix loop: the last patch applied to the code and how many fix rounds ran
+    code_diff: str
+    review_rounds: int
+    # Hash of the inputs each node last ran on, to skip nodes whose inputs are unchanged
+    fingerprints: Annotated[dict, merge_entries]
+    # Deliverables whose current text comes from a hand edit (key -> True), until their node regenerates them
+    hand_edited: Annotated[dict, merge_entries]
+
+def initial_state(spec=DEFAULT_SPEC):
+    """Empty state for a new run of the given project spec"""
+    return {
+        "spec": spec,
+        "requirements": "",
+        "design": "",
+        "code": "",
+        "review": "",
+        "tests": "",
+        "verification": "",
+        "deploy": "",
+        "code_diff": "",
+        "review_rounds": 0,
+        "fingerprints": {},
+        "hand_edited": {},
+    }
+
+class WorkflowHooks:
+    """Callbacks a front end implements to follow a run; the defaults do nothing"""
+
+    def stage_started(self, agent_name):
+        pass
+
+    def communicate(self, agent_name, message, recipient=None, is_handover=False):
+        pass
+
+    def working(self, message):
+        """Context manager wrapped around an agent's work"""
+        return nullcontext()
+
+    def partial_output(self, output_key, text):
+        pass
+
+    def stream_finished(self, output_key, stats):
+        pass
+
+    def context_compacted(self, output_key, original, compacted):
+        pass
+
+    def stage_completed(self, agent_name, output_key, output):
+        pass
+
+    def error(self, message):
+        pass
+
+    def speculation_finished(self, report):
+        """Latency hidden and wasted by speculative pipelining in this run"""
+        pass
+
+    def stage_recorded(self, record):
+        """Metrics record of one finished node execution"""
+        pass
+
+def get_hooks(config):
+    """Hooks passed in the run config, or no-op hooks for headless runs"""
+    return (config or {}).get("configurable", {}).get("hooks") or WorkflowHooks()
+
+_llm_cache = None
+_shared_lock = threading.Lock()
+
+def get_llm_cache():
+    """Process-wide LLM response cache"""
+    global _llm_cache
+    with _shared_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMCache(LLM_CACHE_DB, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL_SECONDS)
+        return _llm_cache
+
+_single_flight = None
+
+def get_single_flight():
+    """Process-wide table of LLM calls in flight, shared by every session"""
+    global _single_flight
+    with _shared_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
+
+_rate_limiter = None
+
+def get_rate_limiter():
+    """Process-wide request and token rate limiter"""
+    global _rate_limiter
+    with _shared_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(RPM_LIMIT, TPM_LIMIT)
+        return _rate_limiter
+
+def backend_for(route):
+    """Shared backend for a route, created once per process and configuration"""
+    if route["backend"] == "replay":
+        return get_backend("replay", path=REPLAY_TRACE, speed=REPLAY_SPEED, model=route["model"])
+    if route["backend"] == "fake":
+        # The stand-in answers under the routed model's name so routing stays visible offline
+        return get_backend("fake", latency=FAKE_LATENCY, response_chars=FAKE_RESPONSE_CHARS, model=route["model"])
+    return get_backend(route["backend"], model=route["model"], api_key=API_KEY,
+                       max_output_tokens=route.get("max_output_tokens"), temperature=route.get("temperature"))
+
+_router = None
+
+def get_router():
+    """Process-wide model router; its latency and error tracking is shared by every run"""
+    global _router
+    with _shared_lock:
+        if _router is None:
+            _router = ModelRouter({"backend": LLM_BACKEND, "model": MODEL_NAME},
+                                  {"backend": LLM_BACKEND, "model": FALLBACK_MODEL}, backend_for)
+            # Verify runs the tests, not a model
+            stuck = _router.without_fallback([node for node in [*NODE_OUTPUTS, *LOOP_OUTPUTS] if node != "Verify"])
+            if stuck:
+                logger.warning("fallback_model is the routed model of %s; these stages cannot fall back", ", ".join(stuck))
+        return _router
+
+async def stream_generate(stream, output_key, hooks, parser=None, queue_seconds=None):
+    """Pass tokens from an async chunk stream to the hooks as they arrive and record stream timings.
+
+    With a code parser the hooks see only the code so far, and the stream is stopped once the module is complete.
+    queue_seconds() is how long the call has waited for rate-limit quota, which is not counted as model time.
+    """
+    chunks = []
+    start = time.time()
+    first_token = None
+    last_render = 0.0
+    stopped_early = False
+    try:
+        async for chunk in stream:
+            now = time.time()
+            if first_token is None:
+                first_token = now - start
+            chunks.append(chunk)
+            if parser and parser.feed(chunk):
+                stopped_early = True
+                break
+            # Throttle updates so long outputs don't re-render on every chunk
+            if now - last_render > 0.1:
+                hooks.partial_output(output_key, parser.code if parser else "".join(chunks))
+                last_render = now
+    finally:
+        await stream.aclose()
+    elapsed = time.time() - start
+    text = "".join(chunks)
+    tokens = estimate_tokens(text)
+    first_token = elapsed if first_token is None else first_token
+    # The quota wait happens before the request is sent, so it only delays the first token
+    queued = queue_seconds() if queue_seconds else 0.0
+    hooks.stream_finished(output_key, {
+        "ttft": max(first_token - queued, 0.0),
+        "tokens": tokens,
+        "tokens_per_sec": tokens / max(elapsed - first_token, 1e-6),
+        "stopped_early": stopped_early,
+    })
+    return text
+
+def prepare_context(config, node, state):
+    """Fit a node's upstream inputs into its token budget and report the savings"""
+    inputs, original, compacted = fit_to_budget(node, state)
+    get_hooks(config).context_compacted({**NODE_OUTPUTS, **LOOP_STATS}[node], original, compacted)
+    return inputs
+
+async def generate(prompt, output_key, config, parser=None):
+    """Call the LLM, serving repeated prompts from the response cache.
+
+    parser (e.g. CodeStreamParser) is instantiated per attempt to follow a streamed answer and end it early.
+    """
+    settings = config.get("configurable", {})
+    trace = settings.get("trace")
+    metrics = stage_metrics()
+    metrics["prompt_tokens"] += estimate_tokens(prompt)
+    router = get_router()
+    route = router.route(metrics["node"])
+    cache = get_llm_cache()
+    key = cache.make_key(route["model"], prompt, route)
+    metrics["model"] = route["model"]
+    if not settings.get("bypass_cache", False):
+        cached = cache.get(key)
+        if cached is not None:
+            metrics["cache_hits"] += 1
+            metrics["completion_tokens"] += estimate_tokens(cached)
+            if trace:
+                trace.llm_call(metrics["node"], prompt, route["model"], cached, cached=True)
+            return cached
+    limiter = get_rate_limiter()
+
+    used = {}
+
+    async def call():
+        # Each attempt is routed afresh, so retries move to the fallback once the primary trips
+        llm, route_used, is_fallback = router.select(metrics["node"])
+        used.update(llm=llm, route=route_used)
+        metrics["fallbacks"] += int(is_fallback)
+        metrics["model"] = llm.model
+
+        async def request():
+            # Only the session that actually calls the model waits for quota and reports to the router
+            if llm.metered:
+                metrics["queue_seconds"] += await limiter.acquire(estimate_tokens(prompt))
+            llm_start = time.time()
+            received = []
+            chunks = llm.astream(prompt) if settings.get("stream", True) else None
+            try:
+                if chunks is not None:
+                    async for chunk in chunks:
+                        received.append(chunk)
+                        yield chunk
+                else:
+                    result = await llm.ainvoke(prompt)
+                    received.append(result)
+                    yield result
+            except Exception:
+                router.observe(route_used, time.time() - llm_start, False)
+                raise
+            except GeneratorExit:
+                # Stopped early by the reader; close the model's stream so it stops generating
+                router.observe(route_used, time.time() - llm_start, any(received))
+                if chunks is not None:
+                    await chunks.aclose()
+                raise
+            finally:
+                # Followers of this call get the same output without spending quota on it
+                if llm.metered:
+                    limiter.charge(estimate_tokens("".join(received)))
+            router.observe(route_used, time.time() - llm_start, any(received))
+
+        def on_coalesced():
+            metrics["coalesced"] += 1
+
+        # Identical prompts already in flight in other sessions share that call
+        stream = get_single_flight().stream(cache.make_key(llm.model, prompt, route_used), request, on_coalesced)
+        used["timing"] = {}
+        stream = timed(stream, used["timing"])
+        start, queued = time.time(), metrics["queue_seconds"]
+        try:
+            if settings.get("stream", True):
+                return await stream_generate(stream, output_key, get_hooks(config), parser() if parser else None,
+                                             lambda: metrics["queue_seconds"] - queued)
+            return "".join([chunk async for chunk in stream])
+        finally:
+            # Time spent waiting for quota counts as queue time, not LLM time
+            used["queued"] = metrics["queue_seconds"] - queued
+            metrics["llm_seconds"] += time.time() - start - used["queued"]
+
+    def on_retry(attempt, delay, error):
+        metrics["retries"] += 1
+
+    try:
+        result = await retry_with_backoff(call, LLM_MAX_RETRIES, on_retry=on_retry)
+    except Exception:
+        metrics["errors"] += 1
+        raise
+    if not result:
+        metrics["errors"] += 1
+        raise ValueError("Empty response from LLM")
+    metrics["completion_tokens"] += estimate_tokens(result)
+    # An answer from the fallback is kept under its own model, not the node's primary one
+    cache.put(key if used["route"] == route else cache.make_key(used["route"]["model"], prompt, used["route"]), result)
+    if trace:
+        timing = used["timing"]
+        trace.llm_call(metrics["node"], prompt, used["route"]["model"], result, chunks=timing["chunks"],
+                       ttft=max(0.0, timing["ttft"] - used["queued"]), seconds=max(0.0, timing["seconds"] - used["queued"]))
+    return result
+
+# Enhanced Agent Functions with Real LLM Integration
+async def RequirementsAgent(state, config):
+    hooks = get_hooks(config)
+    hooks.stage_started("Requirements Agent")
+    hooks.communicate("Requirements Agent", "🚀 Starting requirements analysis for the project spec...")
+    
+    # Show current agent working until task is complete
+    with hooks.working("Requirements Agent analyzing project needs..."):
+        prompt = f"""You are a senior software analyst with expertise in requirements engineering. 
+        
+        Define comprehensive requirements for {state.get('spec') or DEFAULT_SPEC}
+        
+        Provide detailed functional and non-functional requirements in a professional format.
+        Include user stories and then  story mapping is compulsory, acceptance criteria, and technical constraints.
+        Format the output in a structured, professional requirements document."""
+        if not LLM_READY:
+            hooks.error("API Key not found. Please set your Google API key in .env file")
+            raise StageError("Requirements", "API Key required")
+        try:
+            requirements = await generate(prompt, "requirements", config)
+        except Exception as e:
+            # Stop the run here rather than handing error text to the next agent
+            hooks.error(f"Requirements Agent Error: {str(e)}")
+            raise StageError("Requirements", str(e)) from e
+        hooks.stage_completed("Requirements Agent", "requirements", requirements)
+        # Handover message
+        hooks.communicate("Requirements Agent", "✅ Requirements analysis complete! Handover to Design Agent with comprehensive requirements document.", "Design Agent", True)
+        return {"requirements": requirements}
+
+async def DesignAgent(state, config):
+    hooks = get_hooks(config)
+    hooks.stage_started("Design Agent")
+    hooks.communicate("Design Agent", "👋 Received handover from Requirements Agent. Starting system architecture design...")
+    
+    with hooks.working("🎨 Design Agent creating system architecture..."):
+        context = prepare_context(config, "Design", state)
+        prompt = f"""You are a senior software architect with expertise in system design and Python development.
+
+        Based on these requirements:
+        {context['requirements']}
+
+        Design a comprehensive system architecture that includes:
+        - Detailed system architecture overview
+        - All required functions with input/output specifications
+        - Data structures and their relationships
+        - Program flow and user interaction patterns
+        - Error handling and validation strategies
+        - CLI interface design principles
+        - Security considerations
+        - Performance optimization approaches
+        
+        Provide a complete technical design document that a developer can directly implement from."""
+        if not LLM_READY:
+            hooks.error("API Key not found. Please set your Google API key in .env file")
+            raise StageError("Design", "API Key required")
+        try:
+            design = await generate(prompt, "design", config)
+        except Exception as e:
+            # Stop the run here rather than handing error text to the next agent
+            hooks.error(f"Design Agent Error: {str(e)}")
+            raise StageError("Design", str(e)) from e
+        hooks.stage_completed("Design Agent", "design", design)
+        hooks.communicate("Design Agent", "🎯 System architecture design completed! Handover to Development Agent with detailed technical blueprint.", "Development Agent", True)
+        return {"design": design}
+
+async def DevAgent(state, config):
+    hooks = get_hooks(config)
+    hooks.stage_started("Development Agent")
+    hooks.communicate("Development Agent", "💻 Received handover from Design Agent. Starting code implementation...")
+    
+    with hooks.working("⚡ Development Agent writing Python code..."):
+        context = prepare_context(config, "Dev", state)
+        prompt = f"""You are a senior Python developer with expertise in clean code and software craftsmanship.
+
+        Based on this system design:
+        {context['design']}
+
+        Write complete, production-ready Python code for the application in this design that includes:
+        
+        - Object-oriented design with proper class structure
+        - All functions specified in the design document
+        - Comprehensive error handling and input validation
+        - User-friendly CLI interface with clear menus and messages
+        - Proper data persistence during the session
+        - Clean, readable, and maintainable code
+        - Appropriate comments and documentation
+        - Following Python best practices and PEP 8 standards
+        
+        Provide ONLY the complete, executable Python code without any explanations or markdown formatting."""
+        if not LLM_READY:
+            hooks.error("API Key not found. Please set your Google API key in .env file")
+            raise StageError("Dev", "API Key required")
+        try:
+            code = await generate(prompt, "code", config, parser=CodeStreamParser)
+        except Exception as e:
+            # Stop the run here rather than handing error text to the next agent
+            hooks.error(f"Development Agent Error: {str(e)}")
+            raise StageError("Dev", str(e)) from e
+        # Fences and explanations would only inflate every downstream prompt
+        cleaned, syntax_error = clean_code(code)
+        code = cleaned or code
+        if syntax_error:
+            hooks.communicate("Development Agent", f"⚠️ The generated code does not parse ({syntax_error}); passing it on for review as is.")
+        hooks.stage_completed("Development Agent", "code", code)
+        hooks.communicate("Development Agent", "⚡ Code implementation finished! Handover to Code Review Agent for quality assurance and Testing Agent for test suite creation.", "Code Review Agent, Testing Agent", True)
+        return {"code": code}
+
+async def CodeReviewAgent(state, config):
+    hooks = get_hooks(config)
+    hooks.stage_started("Code Review Agent")
+    if state.get("code_diff"):
+        return await rereview(state, config)
+    hooks.communicate("Code Review Agent", "🔍 Received handover from Development Agent. Conducting comprehensive code review...")
+    
+    with hooks.working("🔍 Code Review Agent analyzing code quality..."):
+        context = prepare_context(config, "Review", state)
+        prompt = f"""You are a senior code reviewer and technical lead with expertise in Python development and software quality assurance.
+
+        Conduct a comprehensive code review of this Python application:
+        
+        {context['code']}
+
+        Provide a detailed code review report that includes:
+        
+        1. **Code Quality Assessment**: Overall quality score and rationale
+        2. **Security Analysis**: Security vulnerabilities or concerns
+        3. **Performance Review**: Performance issues and optimization opportunities  
+        4. **Bug Detection**: Any bugs, logical errors, or edge cases not handled
+        5. **Best Practices**: Adherence to Python best practices and coding standards
+        6. **Maintainability**: Code structure, readability, and maintainability assessment
+        7. **Testing Recommendations**: Areas that need testing focus
+        8. **Improvement Suggestions**: Specific recommendations for enhancement
+        9. **Code Refactoring**: Any refactoring suggestions with examples
+        10. **Final Verdict**: Ready for production or needs modifications
+        
+        Provide actionable feedback that the development team can implement.
+        End with a line `VERDICT: APPROVED` if the code is ready for production, or `VERDICT: CHANGES REQUESTED` otherwise."""
+        if not LLM_READY:
+            hooks.error("API Key not found. Please set your Google API key in .env file")
+            raise StageError("Review", "API Key required")
+        try:
+            review = await generate(prompt, "review", config)
+        except Exception as e:
+            # Stop the run here rather than handing error text to the next agent
+            hooks.error(f"Code Review Agent Error: {str(e)}")
+            raise StageError("Review", str(e)) from e
+        hooks.stage_completed("Code Review Agent", "review", review)
+        hooks.communicate("Code Review Agent", "✨ Code review completed with detailed analysis! Handover of findings to Development Agent for fixes, or to Deployment Agent if approved.", "Development Agent, Deployment Agent", True)
+        # A full review starts a new fix loop
+        return {"review": review, "review_rounds": 0}
+
+async def rereview(state, config):
+    """Review only the hunks of the last fix, against the previous findings"""
+    hooks = get_hooks(config)
+    hooks.communicate("Code Review Agent", f"🔍 Re-reviewing fix round {state['review_rounds']} ({len(state['code_diff'].splitlines())} diff lines)...")
+    
+    with hooks.working("🔍 Code Review Agent checking the fix..."):
+        findings = compact(state["review"], STAGE_BUDGETS["Fix"]["review"], SECTION_PRIORITIES["Fix"]["review"])
+        outline = outline_code(extract_code(state["code"])) or ""
+        prompt = f"""You are a senior code reviewer checking a fix to code you reviewed earlier.
+
+        Your previous findings:
+        {findings}
+
+        Outline of the code after the fix:
+        {outline}
+
+        The developer applied this patch:
+        {state['code_diff']}
+
+        Check whether the patch resolves the findings without introducing new problems.
+        List any issues that remain, concisely, with the same section headings as before.
+        End with a line `VERDICT: APPROVED` if the code is now ready for production, or `VERDICT: CHANGES REQUESTED` otherwise."""
+        try:
+            review = await generate(prompt, "review", config)
+        except Exception as e:
+            hooks.error(f"Code Review Agent Error: {str(e)}")
+            raise StageError("Review", str(e)) from e
+        # The full report stays; each re-review is appended as its own round
+        review = f"{state['review'].rstrip()}\n\n## Re-review of fix round {state['review_rounds']}\n\n{review}"
+        hooks.stage_completed("Code Review Agent", "review", review)
+        verdict = "approved ✅" if approved(review) else "changes still requested"
+        hooks.communicate("Code Review Agent", f"✨ Re-review of fix round {state['review_rounds']}: {verdict}.", "Development Agent", True)
+        return {"review": review, "code_diff": ""}
+
+async def FixAgent(state, config):
+    hooks = get_hooks(config)
+    hooks.stage_started("Development Agent")
+    hooks.communicate("Development Agent", f"🛠️ Received review findings. Preparing fix round {state.get('review_rounds', 0) + 1} as a patch...")
+    
+    with hooks.working("🛠️ Development Agent patching the code..."):
+        context = prepare_context(config, "Fix", state)
+        prompt = f"""You are a senior Python developer fixing the issues found in a code review.
+
+        REVIEW FINDINGS:
+        {context['review']}
+
+        CURRENT CODE (app.py):
+        {context['code']}
+
+        Reply with ONLY a unified diff against app.py (--- a/app.py, +++ b/app.py, then @@ hunks with 3 lines of context)
+        that fixes the findings. Change only what the findings require.
+        If nothing needs to change, reply with NO CHANGES."""
+        try:
+            answer = await generate(prompt, "code_diff", config)
+        except Exception as e:
+            hooks.error(f"Development Agent Error: {str(e)}")
+            raise StageError("Fix", str(e)) from e
+        rounds = state.get("review_rounds", 0) + 1
+        if NO_CHANGES.search(answer) and "@@" not in answer:
+            # The developer judged the findings need no change: the loop ends with the reviewed code
+            hooks.communicate("Development Agent", "✅ No changes needed for the review findings; keeping the reviewed code.")
+            return {"code_diff": "", "review_rounds": rounds}
+        try:
+            code = apply_diff(state["code"], answer)
+        except PatchError as e:
+            # An unusable patch ends the loop; the reviewed code goes on unchanged
+            hooks.communicate("Development Agent", f"⚠️ Patch could not be applied ({e}); keeping the reviewed code.")
+            return {"code_diff": "", "review_rounds": rounds}
+        diff = unified_diff(state["code"], code)
+        if diff:
+            hooks.stage_completed("Development Agent", "code", code)
+            hooks.communicate("Development Agent", f"🛠️ Fix round {rounds} changed {len(diff.splitlines())} diff lines. Handover to Code Review Agent.", "Code Review Agent", True)
+        return {"code": code, "code_diff": diff, "review_rounds": rounds}
+
+def approved(review):
+    """Whether the latest verdict of a review (its last re-review round, if any) approves the code"""
+    verdicts = VERDICT.findall(review)
+    return bool(verdicts) and verdicts[-1].upper() == "APPROVED"
+
+def after_review(state):
+    """Send the code back for a fix until the reviewer approves or the round limit is reached"""
+    review = get_artifact_store().get(state.get("review") or "")
+    if state.get("review_rounds", 0) >= MAX_REVIEW_ROUNDS or approved(review):
+        return END
+    return "Fix"
+
+def after_fix(state):
+    """Re-review a patch; a fix that changed nothing ends the loop"""
+    return "Review" if state.get("code_diff") else END
+
+async def TestingAgent(state, config):
+    hooks = get_hooks(config)
+    hooks.stage_started("Testing Agent")
+    hooks.communicate("Testing Agent", "🧪 Received handover from Development Agent. Creating comprehensive test suite...")
+    
+    with hooks.working("🧪 Testing Agent writing unit tests..."):
+        context = prepare_context(config, "Testing", state)
+        prompt = f"""You are a senior QA engineer and test automation specialist with expertise in Python testing frameworks.
+
+        Based on the application code:
+        
+        CODE:
+        {context['code']}
+
+        The code is saved as app.py; import what you test from the app module.
+
+        Create a comprehensive test suite using Python's unittest framework that includes:
+        
+        1. **Unit Tests**: Test all individual functions and methods
+        2. **Integration Tests**: Test component interactions
+        3. **Edge Case Testing**: Test boundary conditions and error scenarios
+        4. **Input Validation Tests**: Test all input validation logic
+        5. **Error Handling Tests**: Test error conditions and exception handling
+        6. **State Management Tests**: Test data persistence and state changes
+        7. **User Interface Tests**: Test CLI menu and user interaction flows
+        8. **Performance Tests**: Basic performance validation
+        9. **Regression Tests**: Tests to prevent future bugs
+        10. **Mock Tests**: Use mocks where appropriate for external dependencies
+        
+        Provide ONLY the complete, executable Python test code using unittest framework.
+        Include proper test setup, teardown, and comprehensive test coverage.
+        Follow testing best practices and naming conventions."""
+        if not LLM_READY:
+            hooks.error("API Key not found. Please set your Google API key in .env file")
+            raise StageError("Testing", "API Key required")
+        try:
+            tests = await generate(prompt, "tests", config, parser=CodeStreamParser)
+        except Exception as e:
+            # Stop the run here rather than handing error text to the next agent
+            hooks.error(f"Testing Agent Error: {str(e)}")
+            raise StageError("Testing", str(e)) from e
+        cleaned, syntax_error = clean_code(tests)
+        tests = cleaned or tests
+        if syntax_error:
+            hooks.communicate("Testing Agent", f"⚠️ The generated tests do not parse ({syntax_error}); verification will report it.")
+        hooks.stage_completed("Testing Agent", "tests", tests)
+        hooks.communicate("Testing Agent", "🎉 Comprehensive test suite completed with full coverage! Handover to Verification Agent to run it against the code.", "Verification Agent", True)
+        return {"tests": tests}
+
+def skip_verification(hooks, reason):
+    """Verification deliverable for a run whose tests were not executed"""
+    verification = f"Verification: skipped ({reason})"
+    hooks.stage_completed("Verification Agent", "verification", verification)
+    hooks.communicate("Verification Agent", "⏭️ Tests were not run. Handover to Deployment Agent without results.", "Deployment Agent", True)
+    return {"verification": verification}
+
+async def VerificationAgent(state, config):
+    hooks = get_hooks(config)
+    hooks.stage_started("Verification Agent")
+    if not VERIFY_TESTS:
+        return skip_verification(hooks, "generated tests are not run on this server, set verify_tests=true to run them")
+    edited = [key for key in EXECUTED_KEYS if (state.get("hand_edited") or {}).get(key)]
+    if edited and not VERIFY_EDITS:
+        return skip_verification(hooks, f"{' and '.join(edited)} edited by hand are not run, set verify_edits=true to run them")
+    hooks.communicate("Verification Agent", "🧫 Received code and tests. Running the test suite in isolated processes...")
+    
+    with hooks.working("🧫 Verification Agent running the generated tests..."):
+        results = []
+
+        def on_result(result):
+            results.append(result)
+            hooks.partial_output("verification", summarize(results))
+
+        try:
+            results = await run_tests(state["code"], state["tests"], VERIFY_WORKERS, TEST_TIMEOUT_SECONDS,
+                                      on_result=on_result, sandbox=VERIFY_SANDBOX)
+        except SandboxError as e:
+            return skip_verification(hooks, f"no sandbox to run them in: {e}")
+        except Exception as e:
+            # Failing tests are a finding, but not being able to run them at all stops the run
+            hooks.error(f"Verification Agent Error: {str(e)}")
+            raise StageError("Verify", str(e)) from e
+        verification = summarize(results)
+        hooks.stage_completed("Verification Agent", "verification", verification)
+        hooks.communicate("Verification Agent", f"📊 {verification.splitlines()[0]}. Handover to Deployment Agent with the results.", "Deployment Agent", True)
+        return {"verification": verification}
+
+async def DeployAgent(state, config):
+    hooks = get_hooks(config)
+    hooks.stage_started("Deployment Agent")
+    hooks.communicate("Deployment Agent", "🚀 Received handovers from Code Review and Verification Agents. Preparing deployment documentation and final package...")
+    
+    with hooks.working("🚀 Deployment Agent preparing final deployment..."):
+        context = prepare_context(config, "Deploy", state)
+        prompt = f"""You are a senior DevOps engineer and deployment specialist with expertise in software delivery and documentation.
+
+        Based on the complete project deliverables:
+        
+        REQUIREMENTS: {context['requirements']}
+        DESIGN: {context['design']}  
+        CODE: {context['code']}
+        REVIEW: {context['review']}
+        TESTS: {context['tests']}
+        TEST RESULTS: {context['verification']}
+
+        Create comprehensive deployment documentation and delivery package that includes:
+        
+        1. **Professional README**: Complete project documentation with features, installation, and usage
+        2. **System Requirements**: Detailed technical requirements and dependencies
+        3. **Installation Guide**: Step-by-step installation instructions for different platforms
+        4. **User Manual**: Comprehensive user guide with examples and screenshots
+        5. **Developer Guide**: Setup instructions for development environment
+        6. **Testing Instructions**: How to run tests and validate installation
+        7. **Troubleshooting Guide**: Common issues and their solutions
+        8. **Performance Specifications**: Performance benchmarks and optimization tips
+        9. **Security Guidelines**: Security considerations and best practices
+        10. **Version Information**: Release notes and version history
+        11. **Support Information**: How to get help and report issues
+        12. **License and Legal**: Licensing information and legal notices
+        
+        Create production-ready documentation that enables easy deployment and maintenance.
+        Format as a professional software release package."""
+        if not LLM_READY:
+            hooks.error("API Key not found. Please set your Google API key in .env file")
+            raise StageError("Deploy", "API Key required")
+        try:
+            deploy = await generate(prompt, "deploy", config)
+        except Exception as e:
+            # Stop the run here rather than handing error text to the next agent
+            hooks.error(f"Deployment Agent Error: {str(e)}")
+            raise StageError("Deploy", str(e)) from e
+        hooks.stage_completed("Deployment Agent", "deploy", deploy)
+        hooks.communicate("Deployment Agent", "✅ Deployment preparation completed successfully! Full SDLC workflow finished - Project ready for production release! 🎉", None, True)
+        return {"deploy": deploy}
+
+# Real data dependencies of each node; edges are derived from these
+NODE_OUTPUTS = {
+    "Requirements": "requirements",
+    "Design": "design",
+    "Dev": "code",
+    "Review": "review",
+    "Testing": "tests",
+    "Verify": "verification",
+    "Deploy": "deploy",
+}
+NODE_INPUTS = {
+    "Requirements": [],
+    "Design": ["requirements"],
+    "Dev": ["design"],
+    "Review": ["code"],
+    "Testing": ["code"],
+    "Verify": ["code", "tests"],
+    "Deploy": ["requirements", "design", "code", "review", "tests", "verification"],
+}
+
+# Artifacts a node waits for without reading them: they order the graph but don't make the node stale
+NODE_WAITS = {
+    # Review covers the whole review/fix loop, so tests run against the final code
+    "Verify": ["review"],
+}
+
+# Deliverables are kept in the artifact store; the graph state only holds their references
+ARTIFACT_KEYS = set(NODE_OUTPUTS.values())
+
+class ArtifactState(Mapping):
+    """Read-only view of the graph state that loads artifact references on access"""
+
+    def __init__(self, state):
+        self.state = state
+
+    def __getitem__(self, key):
+        value = self.state[key]
+        return get_artifact_store().get(value) if key in ARTIFACT_KEYS and value else value
+
+    def __iter__(self):
+        return iter(self.state)
+
+    def __len__(self):
+        return len(self.state)
+
+def store_artifacts(update):
+    """Replace deliverable texts in a state update with artifact references"""
+    store = get_artifact_store()
+    return {key: store.put(value) if key in ARTIFACT_KEYS and value else value for key, value in update.items()}
+
+def load_artifacts(state):
+    """Copy of a state with every artifact reference replaced by its text"""
+    return dict(ArtifactState(state))
+
+# Fix is outside the derived DAG: it sits in a loop with Review
+LOOP_OUTPUTS = {"Fix": "code"}
+LOOP_INPUTS = {"Fix": ["code", "review"]}
+LOOP_PARENTS = {"Review": ["Fix"], "Fix": ["Review"]}
+# Fix reports its stream and context stats under its patch, so they don't overwrite Dev's under "code"
+LOOP_STATS = {"Fix": "code_diff"}
+# Nodes that run beside the loop on the code from before its fixes
+LOOP_SIBLINGS = {"Fix": ["Testing"]}
+
+# Name each node's agent reports under
+NODE_AGENTS = {
+    "Requirements": "Requirements Agent",
+    "Design": "Design Agent",
+    "Dev": "Development Agent",
+    "Review": "Code Review Agent",
+    "Testing": "Testing Agent",
+    "Verify": "Verification Agent",
+    "Deploy": "Deployment Agent",
+    "Fix": "Development Agent",
+}
+
+def node_dependencies():
+    """Map each node to the nodes it directly waits for (transitive edges removed)"""
+    producers = {output: node for node, output in NODE_OUTPUTS.items()}
+    deps = {node: {producers[key] for key in inputs + NODE_WAITS.get(node, [])} for node, inputs in NODE_INPUTS.items()}
+
+    def ancestors(node):
+        seen = set()
+        stack = list(deps[node])
+        while stack:
+            parent = stack.pop()
+            if parent not in seen:
+                seen.add(parent)
+                stack.extend(deps[parent])
+        return seen
+
+    return {
+        node: sorted(parent for parent in parents if not any(parent in ancestors(other) for other in parents))
+        for node, parents in deps.items()
+    }
+
+def stale_nodes(edited_keys):
+    """Nodes that must run again after the given artifacts were edited"""
+    stale = set()
+    changed = set(edited_keys)
+    for node in NODE_OUTPUTS:
+        # NODE_OUTPUTS is in topological order, so one pass reaches every descendant
+        if changed & set(NODE_INPUTS[node]):
+            stale.add(node)
+            changed.add(NODE_OUTPUTS[node])
+    return stale
+
+def loop_nodes(edited_keys):
+    """Loop nodes that may run again after the given artifacts were edited, depending on the review's verdict"""
+    changed = set(edited_keys) | {NODE_OUTPUTS[node] for node in stale_nodes(edited_keys)}
+    return {node for node, inputs in LOOP_INPUTS.items() if changed & set(inputs)}
+
+def input_fingerprint(node, state):
+    """Hash of everything a node's output depends on: its inputs (by reference) and its model route"""
+    fields = {**NODE_INPUTS, **LOOP_INPUTS}[node] or ["spec"]
+    payload = {"node": node, "model": get_router().route(node), "inputs": {key: state.get(key) or "" for key in fields}}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+def instrumented(node, agent):
+    """Wrap an agent so every call records wall, queue and LLM time, tokens and errors"""
+    parents = node_dependencies().get(node, []) + LOOP_PARENTS.get(node, [])
+    output_key = {**NODE_OUTPUTS, **LOOP_OUTPUTS}[node]
+
+    async def run(state, config):
+        settings = config.get("configurable", {})
+        fingerprint = input_fingerprint(node, state)
+        if state.get(output_key) and (state.get("fingerprints") or {}).get(node) == fingerprint:
+            # Same inputs as the last run: keep the existing (possibly hand-edited) output
+            hooks = get_hooks(config)
+            hooks.communicate(NODE_AGENTS[node], "♻️ Inputs unchanged, reusing previous deliverable.")
+            hooks.stage_completed(NODE_AGENTS[node], output_key, get_artifact_store().get(state[output_key]))
+            return {"fingerprints": {node: fingerprint}}
+        clock = settings.get("run_clock") or {"started": time.time(), "finished": {}}
+        start = time.time()
+        ready = max([clock["finished"][p] for p in parents if p in clock["finished"]] or [clock["started"]])
+        record = new_stage_record(settings.get("thread_id"), node)
+        record["queue_seconds"] = max(0.0, start - ready)
+        speculation = settings.get("speculation")
+        try:
+            with track_stage(record):
+                update = None
+                if speculation:
+                    hooks = get_hooks(config)
+                    update = await speculation.claim(node, state, hooks, NODE_AGENTS[node], record)
+                    config = speculation.bind(config, state, hooks)
+                if update is None:
+                    update = await agent(ArtifactState(state), config)
+            stored = store_artifacts(update)
+            fingerprints = {node: fingerprint}
+            extra = {}
+            if node not in LOOP_OUTPUTS and (state.get("hand_edited") or {}).get(output_key):
+                # Regenerated from scratch; a fix round only patches the edited text, so it stays flagged
+                extra["hand_edited"] = {output_key: False}
+            fixed = {**state, **stored}
+            for sibling in LOOP_SIBLINGS.get(node, []):
+                # A sibling that was current before this fix still is: the fix is the loop's, not an edit
+                if (state.get("fingerprints") or {}).get(sibling) == input_fingerprint(sibling, state):
+                    fingerprints[sibling] = input_fingerprint(sibling, fixed)
+            return {**stored, **extra, "fingerprints": fingerprints}
+        finally:
+            clock["finished"][node] = time.time()
+            record["wall_seconds"] = clock["finished"][node] - start
+            get_recorder().record(record)
+            get_hooks(config).stage_recorded(record)
+            if settings.get("trace"):
+                settings["trace"].write("stage", **record)
+
+    return run
+
+# Create the LangGraph workflow
+def create_workflow(checkpointer=None):
+    from langgraph.graph import StateGraph
+
+    graph = StateGraph(BuildState)
+    
+    graph.add_node("Requirements", instrumented("Requirements", RequirementsAgent))
+    graph.add_node("Design", instrumented("Design", DesignAgent))
+    graph.add_node("Dev", instrumented("Dev", DevAgent))
+    graph.add_node("Review", instrumented("Review", CodeReviewAgent))
+    graph.add_node("Testing", instrumented("Testing", TestingAgent))
+    # Deferred: its join fires on Review's first pass, but it must run after the last fix
+    graph.add_node("Verify", instrumented("Verify", VerificationAgent), defer=True)
+    graph.add_node("Deploy", instrumented("Deploy", DeployAgent))
+    graph.add_node("Fix", instrumented("Fix", FixAgent))
+    
+    # Fan out where nodes share an input, fan in where a node has several
+    deps = node_dependencies()
+    for node, parents in deps.items():
+        if not parents:
+            graph.add_edge(START, node)
+        elif len(parents) == 1:
+            graph.add_edge(parents[0], node)
+        else:
+            graph.add_edge(parents, node)
+    for node in deps:
+        if not any(node in parents for parents in deps.values()):
+            graph.add_edge(node, END)
+    
+    # Review/fix loop; its exit is Review's join into Verify above
+    graph.add_conditional_edges("Review", after_review, ["Fix", END])
+    graph.add_conditional_edges("Fix", after_fix, ["Review", END])
+    
+    return graph.compile(checkpointer=checkpointer)
+
+_workflow = None
+
+def get_workflow(checkpointer=None):
+    """The graph, compiled once per process and bound to checkpointer"""
+    global _workflow
+    with _shared_lock:
+        if _workflow is None:
+            start = time.perf_counter()
+            _workflow = create_workflow()
+            record_startup("compile_seconds", time.perf_counter() - start)
+    return _workflow.copy(update={"checkpointer": checkpointer}) if checkpointer else _workflow
+
+def open_checkpointer(path=CHECKPOINT_DB):
+    """Async context manager for the SQLite checkpointer"""
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    return AsyncSqliteSaver.from_conn_string(path)
+
+async def run_workflow(inputs, config, checkpointer=None):
+    """Run or resume the graph (inputs=None resumes), executing ready nodes concurrently"""
+    if checkpointer is None:
+        async with open_checkpointer() as saver:
+            return await run_workflow(inputs, config, saver)
+    app = get_workflow(checkpointer)
+    # Shared by all nodes of this run to measure how long each waited for its inputs
+    settings = {**config.get("configurable", {}), "run_clock": {"started": time.time(), "finished": {}}}
+    if LLM_BACKEND == "replay":
+        # A replay plays back its trace, not answers cached by earlier live runs
+        settings["bypass_cache"] = True
+    trace = None
+    if settings.get("record_trace", RECORD_TRACES) and LLM_BACKEND != "replay":
+        trace = TraceWriter(trace_path(settings.get("thread_id") or "run", TRACE_DIR))
+        trace.write("run", run_id=settings.get("thread_id"), spec=(inputs or {}).get("spec"),
+                    resumed=inputs is None, backend=LLM_BACKEND)
+        settings.update(trace=trace, hooks=TracingHooks(get_hooks(config), trace))
+    speculation = None
+    if settings.get("speculate", SPECULATE):
+        speculation = Speculation(SPECULATION_TRIGGERS, {"Design": DesignAgent, "Dev": DevAgent}, NODE_OUTPUTS, ArtifactState)
+        # Triggers are detected in the upstream stream
+        settings.update(speculation=speculation, stream=True)
+    status = "failed"
+    try:
+        result = await app.ainvoke(inputs, {**config, "configurable": settings, "max_concurrency": MAX_CONCURRENCY})
+        status = "done"
+        return result
+    finally:
+        if speculation:
+            get_hooks({"configurable": settings}).speculation_finished(speculation.close())
+        if trace:
+            trace.write("end", status=status)
+            trace.close()
+
+async def run_or_resume(spec, config, checkpointer=None):
+    """Resume the run's checkpoint if it has one, otherwise start it from the spec"""
+    if checkpointer is None:
+        async with open_checkpointer() as saver:
+            return await run_or_resume(spec, config, saver)
+    resume = await checkpointer.aget_tuple(config) is not None
+    return await run_workflow(None if resume else initial_state(spec), config, checkpointer)
+
+async def rerun_with_edits(edits, config, checkpointer=None):
+    """Apply edited artifacts to a finished run and recompute only the nodes whose inputs changed"""
+    if checkpointer is None:
+        async with open_checkpointer() as saver:
+            return await rerun_with_edits(edits, config, saver)
+    snapshot = await get_workflow(checkpointer).aget_state(config)
+    inputs = {**snapshot.values, **store_artifacts(edits), "hand_edited": {key: True for key in edits}}
+    return await run_workflow(inputs, config, checkpointer)
+
+async def load_state_refs(thread_id, checkpointer=None):
+    """Artifact references of a run's latest checkpoint, or None if there is none"""
+    if checkpointer is None:
+        async with open_checkpointer() as saver:
+            return await load_state_refs(thread_id, saver)
+    snapshot = await get_workflow(checkpointer).aget_state({"configurable": {"thread_id": thread_id}})
+    if not snapshot.values:
+        return None
+    return {key: snapshot.values.get(key) for key in ARTIFACT_KEYS}